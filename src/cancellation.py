@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+from collections.abc import Callable
+from concurrent.futures import Future
+from contextvars import ContextVar
+from typing import Any, TypeVar
+
+from .exceptions import InContextCancelledError
+
+T = TypeVar("T")
+
+
+class CancellationToken:
+    """Signals to work started on behalf of something (like a card being reviewed) that it is no longer needed."""
+
+    def __init__(self) -> None:
+        # Completed on cancellation, so that waiting code can include it in the futures it waits on
+        self.future: Future[None] = Future()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.future.done()
+
+    def cancel(self) -> None:
+        if not self.future.done():
+            self.future.set_result(None)
+
+    def add_callback(self, callback: Callable[[], Any]) -> None:
+        """Call `callback` on cancellation, or right away if already cancelled."""
+        self.future.add_done_callback(lambda _: callback())
+
+    def raise_if_cancelled(self) -> None:
+        if self.cancelled:
+            raise InContextCancelledError()
+
+
+_current_token: ContextVar[CancellationToken | None] = ContextVar("_current_token", default=None)
+
+
+def current_token() -> CancellationToken | None:
+    return _current_token.get()
+
+
+def check_cancelled() -> None:
+    """Raise InContextCancelledError if the work running in the current context was cancelled."""
+    token = _current_token.get()
+    if token:
+        token.raise_if_cancelled()
+
+
+def run_with_token(token: CancellationToken, func: Callable[..., T], *args: Any) -> T:
+    """Run `func` with `token` as the current token, after checking that it wasn't cancelled in the meantime."""
+    reset = _current_token.set(token)
+    try:
+        token.raise_if_cancelled()
+        return func(*args)
+    finally:
+        _current_token.reset(reset)
@@ -1,12 +1,21 @@
 from __future__ import annotations
 
 import dataclasses
+import hashlib
+import json
+import random
 import sqlite3
+import time
+import zlib
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
 from pathlib import Path
 from threading import Lock
 from types import TracebackType
 
 from .consts import consts
+from .log import logger
+from .memory_cache import MISSING, LRUCache
 
 
 @dataclasses.dataclass
@@ -18,19 +27,119 @@ class Sentence:
     source: str = ""
 
 
+# Outcomes of fetches recorded in the fetches table
+FETCH_OK = "ok"
+FETCH_EMPTY = "empty"
+FETCH_ERROR = "error"
+
+
+@dataclasses.dataclass
+class FetchStatus:
+    word: str
+    language: str
+    provider: str
+    status: str
+    # Unix time of the last fetch. For cached sentences whose refresh failed, the time of the failed refresh.
+    fetched_at: float
+    # Number of consecutive empty or failed fetches, or failed refreshes of cached sentences
+    failures: int = 1
+    error: str = ""
+
+
+# Sentence texts at least this long (in bytes) are stored compressed if that makes them smaller
+COMPRESSION_MIN_SIZE = 200
+
+
+def text_hash(text: str) -> bytes:
+    return hashlib.blake2b(text.encode(), digest_size=16).digest()
+
+
+def pack_text(text: str) -> str | bytes:
+    """Return the stored form of a sentence text: compressed bytes for long texts, otherwise the text itself."""
+    data = text.encode()
+    if len(data) >= COMPRESSION_MIN_SIZE:
+        compressed = zlib.compress(data)
+        if len(compressed) < len(data):
+            return compressed
+    return text
+
+
+def unpack_text(value: str | bytes) -> str:
+    return zlib.decompress(value).decode() if isinstance(value, bytes) else value
+
+
 class SentenceDB:
     # Schema upgrade code is adapted from https://github.com/ankitects/anki/blob/af8ae69837c0712b2c8be6b46a27191873d539c3/rslib/src/storage/sqlite.rs
     SCHEMA_STARTING_VERSION = 1
-    SCHEMA_MAX_VERSION = 2
+    SCHEMA_MAX_VERSION = 8
+    # Each distinct text is stored once in sentence_texts, and `sentences` maps words to them.
+    # The selected columns are mapped to Sentence fields, in order.
+    SENTENCES_JOIN = "sentences AS s JOIN sentence_texts AS t ON t.id = s.text_id"
+    SELECT_SENTENCES = f"SELECT t.text, s.word, s.language, s.provider, s.source FROM {SENTENCES_JOIN}"
+    MAX_IDLE_READERS = 4
+    # Fraction of the budgets to shrink the cache to when evicting, so that eviction doesn't run on every insert
+    EVICTION_LOW_WATERMARK = 0.9
+    # Approximate storage size of a sentence row, for weighing groups against each other
+    SENTENCE_SIZE = "length(CAST(t.text AS BLOB)) + length(CAST(coalesce(s.source, '') AS BLOB))"
+    # Groups with more sentences than this are sampled in SQLite instead of being kept in memory
+    MAX_MEMORY_CACHED_SENTENCES = 500
+    # Rough per-object memory overhead used for sizing memory cache entries
+    OBJECT_OVERHEAD = 200
+    # Number of keys resolved per query by get_random_sentences_batch()
+    BATCH_LOOKUP_SIZE = 5000
 
-    def __init__(self, path: Path | None = None):
-        self.con = sqlite3.connect(path or consts.dir / "user_files" / "sentences.db", check_same_thread=False)
+    def __init__(self, path: Path | None = None, max_size: int = 0, max_sentences: int = 0):
+        """`max_size` (bytes) and `max_sentences` bound the cache when `maintain()` runs. 0 means unbounded."""
+        self.path = path or consts.dir / "user_files" / "sentences.db"
+        self.max_size = max_size
+        self.max_sentences = max_sentences
+        # All writes go through this connection and are serialized by `lock`. Reads use a pool of
+        # separate connections, which thanks to WAL mode never wait on the writer or on each other.
+        self.con = sqlite3.connect(self.path, check_same_thread=False)
+        self.con.create_function("text_hash", 1, text_hash, deterministic=True)
+        self.con.create_function("pack_text", 1, pack_text, deterministic=True)
         self.lock = Lock()
+        self._readers: list[sqlite3.Connection] = []
+        self._readers_lock = Lock()
+        # Last access times of (word, language, provider) groups, written out in batches by flush_access_times()
+        self._accessed: dict[tuple[str, str, str], float] = {}
+        self._accessed_lock = Lock()
+        # Sentences and fetch statuses of recently looked up words, so that repeated lookups don't hit SQLite
+        self.memory_cache = LRUCache()
+        self.con.executescript(
+            """
+            PRAGMA auto_vacuum = INCREMENTAL;
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+            """
+        )
         self._open_or_create_db()
 
     def close(self) -> None:
+        self.flush_access_times()
+        with self._readers_lock:
+            readers, self._readers = self._readers, []
+        for reader in readers:
+            reader.close()
         self.con.close()
 
+    @contextmanager
+    def _reader(self) -> Iterator[sqlite3.Connection]:
+        with self._readers_lock:
+            con = self._readers.pop() if self._readers else None
+        if con is None:
+            con = sqlite3.connect(self.path, check_same_thread=False)
+            con.execute("PRAGMA query_only = ON")
+        try:
+            yield con
+        finally:
+            with self._readers_lock:
+                if len(self._readers) < self.MAX_IDLE_READERS:
+                    self._readers.append(con)
+                    con = None
+            if con is not None:
+                con.close()
+
     def __enter__(self) -> SentenceDB:
         return self
 
@@ -57,6 +166,7 @@ class SentenceDB:
             if create:
                 self.con.executescript(
                     f"""
+                BEGIN;
                 CREATE TABLE sentences (
                     text TEXT,
                     word TEXT,
@@ -69,70 +179,508 @@ class SentenceDB:
                     ver INT
                 );
                 INSERT INTO col(id, ver) VALUES (1, {self.SCHEMA_STARTING_VERSION});
+                COMMIT;
                 """
                 )
             if create or upgrade:
                 self._upgrade_to_latest_schema(version)
 
     def _upgrade_to_latest_schema(self, version: int) -> None:
+        # Each step runs in its own transaction, so an interrupted upgrade resumes from the last completed step.
+        # executescript() commits any pending transaction first, which is why the steps don't share one.
         if version < 2:
             self.con.executescript("""
+                BEGIN;
                 ALTER TABLE sentences ADD COLUMN source TEXT;
                 UPDATE col SET ver = 2;
+                COMMIT;
+            """)
+        if version < 3:
+            # Every row gets a random key, indexed per (word, language, provider) group, that is used
+            # for sampling random rows without sorting the whole group
+            self.con.executescript("""
+                BEGIN;
+                ALTER TABLE sentences ADD COLUMN sample_key INTEGER;
+                UPDATE sentences SET sample_key = random();
+                CREATE INDEX sentences_lookup ON sentences (word, language, provider, sample_key);
+                UPDATE col SET ver = 3;
+                COMMIT;
+            """)
+        if version < 4:
+            self.con.executescript("""
+                BEGIN;
+                CREATE TABLE fetches (
+                    word TEXT,
+                    language TEXT,
+                    provider TEXT,
+                    status TEXT,
+                    fetched_at REAL,
+                    failures INTEGER,
+                    error TEXT,
+                    PRIMARY KEY(word, language, provider)
+                ) WITHOUT ROWID;
+                UPDATE col SET ver = 4;
+                COMMIT;
+            """)
+        if version < 5:
+            # Successful fetches are tracked too from now on. Sentences cached before that are treated
+            # as fetched now, rather than all going stale at once.
+            self.con.execute(
+                f"""INSERT OR IGNORE INTO fetches (word, language, provider, status, fetched_at, failures, error)
+                SELECT DISTINCT word, language, provider, '{FETCH_OK}', ?, 0, '' FROM sentences""",
+                (time.time(),),
+            )
+            self.con.execute("UPDATE col SET ver = 5")
+        if version < 6:
+            self.con.executescript("""
+                BEGIN;
+                ALTER TABLE fetches ADD COLUMN accessed_at REAL;
+                UPDATE col SET ver = 6;
+                COMMIT;
+            """)
+        if version < 7:
+            # Move texts into their own table keyed by content hash, so that a sentence shared by several words
+            # or providers is only stored once
+            self.con.executescript("""
+                BEGIN;
+                CREATE TABLE sentence_texts (
+                    id INTEGER PRIMARY KEY,
+                    hash BLOB NOT NULL UNIQUE,
+                    text NOT NULL
+                );
+                INSERT OR IGNORE INTO sentence_texts (hash, text)
+                SELECT text_hash(text), pack_text(text) FROM sentences;
+                DROP INDEX sentences_lookup;
+                ALTER TABLE sentences RENAME TO old_sentences;
+                CREATE TABLE sentences (
+                    word TEXT,
+                    language TEXT,
+                    provider TEXT,
+                    text_id INTEGER,
+                    source TEXT,
+                    sample_key INTEGER,
+                    PRIMARY KEY(word, language, provider, text_id)
+                ) WITHOUT ROWID;
+                INSERT OR IGNORE INTO sentences (word, language, provider, text_id, source, sample_key)
+                SELECT o.word, o.language, o.provider, t.id, o.source, o.sample_key
+                FROM old_sentences AS o JOIN sentence_texts AS t ON t.hash = text_hash(o.text);
+                DROP TABLE old_sentences;
+                CREATE INDEX sentences_lookup ON sentences (word, language, provider, sample_key);
+                CREATE INDEX sentences_text_id ON sentences (text_id);
+                UPDATE col SET ver = 7;
+                COMMIT;
+            """)
+        if version < 8:
+            # Number the sentences of each (word, language, provider) group densely from 0, so that a uniform
+            # random sample is a set of random ordinals. Groups are only ever deleted as a whole, which keeps
+            # the numbering dense.
+            self.con.executescript("""
+                BEGIN;
+                DROP INDEX sentences_lookup;
+                DROP INDEX sentences_text_id;
+                ALTER TABLE sentences RENAME TO old_sentences;
+                CREATE TABLE sentences (
+                    word TEXT,
+                    language TEXT,
+                    provider TEXT,
+                    text_id INTEGER,
+                    source TEXT,
+                    ordinal INTEGER,
+                    PRIMARY KEY(word, language, provider, text_id)
+                ) WITHOUT ROWID;
+                INSERT INTO sentences (word, language, provider, text_id, source, ordinal)
+                SELECT word, language, provider, text_id, source,
+                    row_number() OVER (PARTITION BY word, language, provider ORDER BY sample_key) - 1
+                FROM old_sentences;
+                DROP TABLE old_sentences;
+                CREATE UNIQUE INDEX sentences_lookup ON sentences (word, language, provider, ordinal);
+                CREATE INDEX sentences_text_id ON sentences (text_id);
+                UPDATE col SET ver = 8;
+                COMMIT;
             """)
 
     def get_random_sentences(self, word: str, language: str, provider: str, limit: int | None = None) -> list[Sentence]:
-        sentences = []
-        with self.con:
-            query = "SELECT * from sentences WHERE word = ? AND language = ?"
-            " AND provider = ? order by RANDOM()"
-            if limit is not None:
-                query += f" limit {limit}"
-            for row in self.con.execute(
-                query,
-                (word, language, provider),
-            ):
-                sentences.append(Sentence(*row))
-        return sentences
+        cached = self.memory_cache.get(("sentences", word, language, provider))
+        if cached is MISSING:
+            generation = self.memory_cache.generation()
+            cached = self._load_sentences(word, language, provider)
+            self._cache_sentences((word, language, provider), cached, generation)
+        if cached is None:
+            rows = self._sample_sentences(word, language, provider, limit)
+        else:
+            rows = random.sample(cached, len(cached) if limit is None else min(limit, len(cached)))
+        if rows:
+            with self._accessed_lock:
+                self._accessed[(word, language, provider)] = time.time()
+        return rows
+
+    def get_random_sentences_batch(
+        self,
+        keys: Iterable[tuple[str, str, str]],
+        limit: int | None = None,
+    ) -> tuple[dict[tuple[str, str, str], list[Sentence]], list[tuple[str, str, str]]]:
+        """Look up random sentences for many (word, language, provider) keys at once.
+
+        Returns the sentences found for each key and the list of keys with no cached sentences.
+        """
+        keys = list(dict.fromkeys(keys))
+        groups: dict[tuple[str, str, str], list[Sentence]] = {}
+        sampled: dict[tuple[str, str, str], list[Sentence]] = {}
+        pending = []
+        for key in keys:
+            cached = self.memory_cache.get(("sentences", *key))
+            if cached is MISSING:
+                pending.append(key)
+            elif cached is None:
+                sampled[key] = self._sample_sentences(*key, limit)
+            elif cached:
+                groups[key] = cached
+        generation = self.memory_cache.generation()
+        loaded: dict[tuple[str, str, str], list[Sentence]] = {key: [] for key in pending}
+        with self._reader() as con:
+            for start in range(0, len(pending), self.BATCH_LOOKUP_SIZE):
+                rows = con.execute(
+                    """
+                    SELECT t.text, s.word, s.language, s.provider, s.source
+                    FROM json_each(?) AS k
+                    JOIN sentences AS s
+                        ON s.word = json_extract(k.value, '$[0]')
+                        AND s.language = json_extract(k.value, '$[1]')
+                        AND s.provider = json_extract(k.value, '$[2]')
+                    JOIN sentence_texts AS t ON t.id = s.text_id
+                    """,
+                    (json.dumps(pending[start : start + self.BATCH_LOOKUP_SIZE]),),
+                )
+                for row in rows:
+                    sentence = self._sentence(row)
+                    loaded[(sentence.word, sentence.language, sentence.provider)].append(sentence)
+        for key, sentences in loaded.items():
+            too_large = len(sentences) > self.MAX_MEMORY_CACHED_SENTENCES
+            self._cache_sentences(key, None if too_large else sentences, generation)
+            if sentences:
+                groups[key] = sentences
+        results = {
+            key: random.sample(sentences, len(sentences) if limit is None else min(limit, len(sentences)))
+            for key, sentences in groups.items()
+        }
+        results.update((key, sentences) for key, sentences in sampled.items() if sentences)
+        now = time.time()
+        with self._accessed_lock:
+            self._accessed.update(dict.fromkeys(results, now))
+        misses = [key for key in keys if key not in results]
+        return results, misses
+
+    def _cache_sentences(self, key: tuple[str, str, str], sentences: list[Sentence] | None, generation: int) -> None:
+        # Groups too large to keep in memory are cached as None, so that lookups go straight to sampling them
+        size = sum(len(s.text) + len(s.source or "") + self.OBJECT_OVERHEAD for s in sentences or [])
+        self.memory_cache.put(("sentences", *key), sentences, size or self.OBJECT_OVERHEAD, generation)
+
+    def _load_sentences(self, word: str, language: str, provider: str) -> list[Sentence] | None:
+        """Load all sentences of a group, or None if it's too large to keep in memory."""
+        with self._reader() as con:
+            rows = con.execute(
+                f"{self.SELECT_SENTENCES} WHERE s.word = ? AND s.language = ? AND s.provider = ? LIMIT ?",
+                (word, language, provider, self.MAX_MEMORY_CACHED_SENTENCES + 1),
+            ).fetchall()
+        if len(rows) > self.MAX_MEMORY_CACHED_SENTENCES:
+            return None
+        return [self._sentence(row) for row in rows]
+
+    def _sample_sentences(self, word: str, language: str, provider: str, limit: int | None) -> list[Sentence]:
+        query = f"{self.SELECT_SENTENCES} WHERE s.word = ? AND s.language = ? AND s.provider = ?"
+        with self._reader() as con:
+            if limit is None:
+                rows = con.execute(query, (word, language, provider)).fetchall()
+            else:
+                # Ordinals are dense, so picking random ones samples the group uniformly. Both queries only
+                # walk the index entries they need, regardless of the group size.
+                count = con.execute(
+                    "SELECT max(ordinal) + 1 FROM sentences WHERE word = ? AND language = ? AND provider = ?",
+                    (word, language, provider),
+                ).fetchone()[0]
+                ordinals = random.sample(range(count or 0), min(limit, count or 0))
+                rows = con.execute(
+                    query + " AND s.ordinal IN (SELECT value FROM json_each(?))",
+                    (word, language, provider, json.dumps(ordinals)),
+                ).fetchall()
+        random.shuffle(rows)
+        return [self._sentence(row) for row in rows]
+
+    @staticmethod
+    def _sentence(row: tuple) -> Sentence:
+        return Sentence(unpack_text(row[0]), *row[1:])
 
     def add_sentences(self, sentences: list[Sentence]) -> None:
-        with self.con:
+        with self.lock, self.con:
+            self._insert_sentences(sentences)
+        self._invalidate({(sentence.word, sentence.language, sentence.provider) for sentence in sentences})
+
+    def replace_sentences(self, word: str, language: str, provider: str, sentences: list[Sentence]) -> None:
+        """Atomically replace the cached sentences of a word with freshly fetched ones."""
+        with self.lock, self.con:
+            self.con.execute(
+                "DELETE FROM sentences WHERE word = ? AND language = ? AND provider = ?",
+                (word, language, provider),
+            )
+            self._insert_sentences(sentences)
+            self._record_fetch(word, language, provider, FETCH_OK)
+        self._invalidate({(word, language, provider), *((s.word, s.language, s.provider) for s in sentences)})
+
+    def _invalidate(self, groups: set[tuple[str, str, str]]) -> None:
+        # Done after committing, so that readers can't cache the old rows again in between
+        self.memory_cache.invalidate(*((kind, *group) for group in groups for kind in ("sentences", "fetch")))
+
+    def merge_sentences(self, sentences: list[tuple[Sentence, float]]) -> None:
+        """Add sentences along with the time they were fetched, keeping any that are already cached."""
+        with self.lock, self.con:
+            self._insert_sentences([sentence for sentence, _ in sentences], update_existing=False)
+            fetched_at = {(s.word, s.language, s.provider): timestamp for s, timestamp in sentences}
+            self.con.executemany(
+                f"""INSERT INTO fetches (word, language, provider, status, fetched_at, failures, error)
+                VALUES (?, ?, ?, '{FETCH_OK}', ?, 0, '')
+                ON CONFLICT (word, language, provider) DO UPDATE SET
+                    status = excluded.status,
+                    fetched_at = excluded.fetched_at,
+                    failures = 0,
+                    error = ''
+                WHERE status != excluded.status""",
+                [(*group, timestamp) for group, timestamp in fetched_at.items()],
+            )
+        self._invalidate(set(fetched_at))
+
+    def _insert_sentences(self, sentences: list[Sentence], update_existing: bool = True) -> None:
+        hashes = [text_hash(sentence.text) for sentence in sentences]
+        self.con.executemany(
+            "INSERT OR IGNORE INTO sentence_texts (hash, text) VALUES (?, ?)",
+            [(hash, pack_text(sentence.text)) for hash, sentence in zip(hashes, sentences)],
+        )
+        self.con.executemany(
+            f"""INSERT INTO sentences (word, language, provider, text_id, source, ordinal)
+            VALUES (?1, ?2, ?3, (SELECT id FROM sentence_texts WHERE hash = ?4), ?5, (
+                SELECT coalesce(max(ordinal) + 1, 0) FROM sentences WHERE word = ?1 AND language = ?2 AND provider = ?3
+            ))
+            ON CONFLICT (word, language, provider, text_id) DO
+            {"UPDATE SET source = excluded.source" if update_existing else "NOTHING"}""",
+            [
+                (
+                    sentence.word,
+                    sentence.language,
+                    sentence.provider,
+                    hash,
+                    sentence.source,
+                )
+                for hash, sentence in zip(hashes, sentences)
+            ],
+        )
+
+    def _delete_orphaned_texts(self) -> None:
+        self.con.execute(
+            "DELETE FROM sentence_texts WHERE NOT EXISTS (SELECT 1 FROM sentences WHERE text_id = sentence_texts.id)"
+        )
+
+    def get_fetch_status(self, word: str, language: str, provider: str) -> FetchStatus | None:
+        key = ("fetch", word, language, provider)
+        status = self.memory_cache.get(key)
+        if status is MISSING:
+            generation = self.memory_cache.generation()
+            with self._reader() as con:
+                row = con.execute(
+                    """SELECT word, language, provider, status, fetched_at, failures, error FROM fetches
+                    WHERE word = ? AND language = ? AND provider = ?""",
+                    (word, language, provider),
+                ).fetchone()
+            status = FetchStatus(*row) if row else None
+            self.memory_cache.put(key, status, self.OBJECT_OVERHEAD + (len(status.error) if status else 0), generation)
+        return status
+
+    def record_fetch(self, word: str, language: str, provider: str, status: str, error: str = "") -> None:
+        """Record the time and outcome of a fetch, counting consecutive empty or failed ones."""
+        with self.lock, self.con:
+            self._record_fetch(word, language, provider, status, error)
+        self._invalidate({(word, language, provider)})
+
+    def _record_fetch(self, word: str, language: str, provider: str, status: str, error: str = "") -> None:
+        self.con.execute(
+            f"""INSERT INTO fetches (word, language, provider, status, fetched_at, failures, error)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (word, language, provider) DO UPDATE SET
+                failures = CASE
+                    WHEN excluded.status = '{FETCH_OK}' THEN 0
+                    WHEN status = excluded.status THEN failures + 1
+                    ELSE 1
+                END,
+                status = excluded.status,
+                fetched_at = excluded.fetched_at,
+                error = excluded.error""",
+            (word, language, provider, status, time.time(), 0 if status == FETCH_OK else 1, error),
+        )
+
+    def record_refresh_error(self, word: str, language: str, provider: str, error: str) -> None:
+        """Record a failed refresh of cached sentences, which are kept and served as before."""
+        with self.lock, self.con:
+            self.con.execute(
+                f"""UPDATE fetches SET fetched_at = ?, failures = failures + 1, error = ?
+                WHERE word = ? AND language = ? AND provider = ? AND status = '{FETCH_OK}'""",
+                (time.time(), error, word, language, provider),
+            )
+        self._invalidate({(word, language, provider)})
+
+    def flush_access_times(self) -> None:
+        with self._accessed_lock:
+            accessed, self._accessed = self._accessed, {}
+        if not accessed:
+            return
+        with self.lock, self.con:
             self.con.executemany(
-                """ INSERT OR REPLACE INTO sentences (text, word, language, provider, source)
-                VALUES (?, ?, ?, ?, ?) """,
-                [
-                    (
-                        sentence.text,
-                        sentence.word,
-                        sentence.language,
-                        sentence.provider,
-                        sentence.source,
-                    )
-                    for sentence in sentences
-                ],
+                "UPDATE fetches SET accessed_at = ? WHERE word = ? AND language = ? AND provider = ?",
+                [(accessed_at, *key) for key, accessed_at in accessed.items()],
             )
 
+    def evict(self) -> int:
+        """Drop the least recently used (word, language, provider) groups until the cache fits in its budgets.
+
+        Returns the number of groups evicted.
+        """
+        with self.lock, self.con:
+            unbounded = 2**63 - 1
+            size_limit = row_limit = unbounded
+            if self.max_size:
+                page_size, page_count, freelist_count = (
+                    self.con.execute(f"PRAGMA {pragma}").fetchone()[0]
+                    for pragma in ("page_size", "page_count", "freelist_count")
+                )
+                used_size = (page_count - freelist_count) * page_size
+                if used_size > self.max_size:
+                    # Stored sizes include indexes and page overhead, so scale the target to the text sizes
+                    text_size = self.con.execute(
+                        f"SELECT total({self.SENTENCE_SIZE}) FROM {self.SENTENCES_JOIN}"
+                    ).fetchone()[0]
+                    size_limit = int(text_size * self.max_size * self.EVICTION_LOW_WATERMARK / used_size)
+            if self.max_sentences:
+                if self.con.execute("SELECT count(*) FROM sentences").fetchone()[0] > self.max_sentences:
+                    row_limit = int(self.max_sentences * self.EVICTION_LOW_WATERMARK)
+            if size_limit == row_limit == unbounded:
+                return 0
+            # Keep the most recently used groups whose running totals fit in the budgets
+            groups = self.con.execute(
+                f"""
+                WITH groups AS (
+                    SELECT
+                        s.word, s.language, s.provider,
+                        count(*) AS row_count,
+                        total({self.SENTENCE_SIZE}) AS size,
+                        (
+                            SELECT coalesce(accessed_at, fetched_at) FROM fetches AS f
+                            WHERE f.word = s.word AND f.language = s.language AND f.provider = s.provider
+                        ) AS used_at
+                    FROM {self.SENTENCES_JOIN}
+                    GROUP BY s.word, s.language, s.provider
+                )
+                SELECT word, language, provider FROM (
+                    SELECT
+                        word, language, provider,
+                        sum(row_count) OVER w AS running_rows,
+                        sum(size) OVER w AS running_size
+                    FROM groups
+                    WINDOW w AS (ORDER BY coalesce(used_at, 0) DESC, word, language, provider)
+                ) WHERE running_size > ? OR running_rows > ?
+                """,
+                (size_limit, row_limit),
+            ).fetchall()
+            for table in ("sentences", "fetches"):
+                self.con.executemany(
+                    f"DELETE FROM {table} WHERE word = ? AND language = ? AND provider = ?",
+                    groups,
+                )
+        self.memory_cache.clear()
+        return len(groups)
+
+    def maintain(self) -> None:
+        """Evict sentences over the budgets, return free pages to the OS, refresh statistics
+        and check the database for corruption. Meant to be run in the background at idle time."""
+        self.flush_access_times()
+        self.evict()
+        with self.lock:
+            with self.con:
+                self._delete_orphaned_texts()
+            # A no-op for databases that still need enable_incremental_vacuum()
+            self.con.executescript("PRAGMA incremental_vacuum;")
+            self.con.execute("PRAGMA optimize")
+        # The check reads the whole file, so it runs on a reader to not hold up writes
+        with self._reader() as con:
+            problems = [row[0] for row in con.execute("PRAGMA quick_check")]
+        if problems != ["ok"]:
+            logger.error("Sentence cache is corrupted", path=str(self.path), problems=problems)
+
+    def needs_full_vacuum(self) -> bool:
+        """Whether the database was created before incremental vacuuming was enabled."""
+        # Pooled readers keep the header they first read, so ask the writer connection
+        with self.lock:
+            return self.con.execute("PRAGMA auto_vacuum").fetchone()[0] == 0
+
+    def enable_incremental_vacuum(self) -> None:
+        """Switch databases created before incremental vacuuming was enabled over with a one-time full vacuum.
+
+        This rewrites the whole file and blocks writes until it's done, so it's meant to run when no lookups happen.
+        """
+        with self.lock:
+            if self.needs_full_vacuum():
+                self.con.executescript("PRAGMA auto_vacuum = INCREMENTAL; VACUUM;")
+
+    def get_cached_languages(self) -> list[str]:
+        with self._reader() as con:
+            return [
+                row[0]
+                for row in con.execute(
+                    f"SELECT DISTINCT language FROM fetches WHERE status = '{FETCH_OK}' ORDER BY language"
+                )
+            ]
+
+    def iter_export_rows(
+        self,
+        language: str | None = None,
+        provider: str | None = None,
+        words: Iterable[str] | None = None,
+    ) -> Iterator[list]:
+        """Yield `[text, word, language, provider, source, fetched_at]` for cached sentences matching the filters."""
+        query = f"""SELECT t.text, s.word, s.language, s.provider, s.source, f.fetched_at FROM {self.SENTENCES_JOIN}
+            LEFT JOIN fetches AS f ON f.word = s.word AND f.language = s.language AND f.provider = s.provider"""
+        where_clauses = []
+        params: list[str] = []
+        if language:
+            where_clauses.append("s.language = ?")
+            params.append(language)
+        if provider:
+            where_clauses.append("s.provider = ?")
+            params.append(provider)
+        if words is not None:
+            where_clauses.append("s.word IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps(list(words)))
+        if where_clauses:
+            query += " WHERE " + " AND ".join(where_clauses)
+        with self._reader() as con:
+            for text, *row, fetched_at in con.execute(query, params):
+                yield [unpack_text(text), *row, fetched_at or time.time()]
+
     def get_sentences(
         self,
         word: str | None = None,
         language: str | None = None,
         provider: str | None = None,
     ) -> list[Sentence]:
-        query = "SELECT * from sentences"
+        query = self.SELECT_SENTENCES
         where_clauses = []
         params = []
         if word:
-            where_clauses.append("word = ?")
+            where_clauses.append("s.word = ?")
             params.append(word)
         if language:
-            where_clauses.append("language = ?")
+            where_clauses.append("s.language = ?")
             params.append(language)
         if provider:
-            where_clauses.append("provider = ?")
+            where_clauses.append("s.provider = ?")
             params.append(provider)
-        query += " WHERE " + " AND ".join(where_clauses)
-        with self.con:
-            sentences: list[Sentence] = []
-            for row in self.con.execute(query, params):
-                sentences.append(Sentence(*row))
-            return sentences
+        if where_clauses:
+            query += " WHERE " + " AND ".join(where_clauses)
+        with self._reader() as con:
+            return [self._sentence(row) for row in con.execute(query, params)]
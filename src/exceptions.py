@@ -15,3 +15,28 @@ class InContextFetchError(InContextError):
 
     def __str__(self) -> str:
         return str(self.__cause__)
+
+
+class InContextIncompleteDownloadError(InContextError):
+    def __init__(self) -> None:
+        super().__init__("The download ended before the whole file was received")
+
+
+class InContextTatoebaDatabaseError(InContextError):
+    def __init__(self, language: str, error: Exception):
+        super().__init__(f"Failed to read the Tatoeba database for {language}: {error}")
+
+
+class InContextInvalidPackError(InContextError):
+    def __init__(self) -> None:
+        super().__init__("The file is not a sentence pack, or it is incomplete or corrupted")
+
+
+class InContextUnsupportedPackVersionError(InContextError):
+    def __init__(self, version: int):
+        super().__init__(f"Sentence pack version {version} is not supported. Please update the add-on.")
+
+
+class InContextCancelledError(InContextError):
+    def __init__(self) -> None:
+        super().__init__("The lookup was cancelled")
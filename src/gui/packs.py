@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from anki.collection import Collection
+from aqt import mw
+from aqt.qt import QComboBox, QDialog, QDialogButtonBox, QFormLayout, QPlainTextEdit, QWidget, qconnect
+from aqt.utils import getFile, getSaveFile, showWarning, tooltip
+
+from ..consts import consts
+from ..packs import export_pack, import_pack
+from ..providers import get_providers
+from ..session import get_db
+from .operations import AddonQueryOp
+
+
+def on_failure(exc: Exception) -> None:
+    showWarning(str(exc), parent=mw, title=consts.name)
+
+
+class ExportPackDialog(QDialog):
+    """Asks which of the cached sentences to export."""
+
+    def __init__(self, parent: QWidget, languages: list[str], providers: list[tuple[str, str]]):
+        super().__init__(parent)
+        self.setWindowTitle(f"{consts.name} - Export sentence pack")
+        self.language_box = QComboBox()
+        self.language_box.addItem("All languages", None)
+        for language in languages:
+            self.language_box.addItem(language, language)
+        self.provider_box = QComboBox()
+        self.provider_box.addItem("All providers", None)
+        for name, human_name in providers:
+            self.provider_box.addItem(human_name, name)
+        self.words_edit = QPlainTextEdit()
+        self.words_edit.setPlaceholderText("One word per line. Leave empty to export all words.")
+        buttons = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
+        qconnect(buttons.accepted, self.accept)
+        qconnect(buttons.rejected, self.reject)
+        layout = QFormLayout(self)
+        layout.addRow("Language", self.language_box)
+        layout.addRow("Provider", self.provider_box)
+        layout.addRow("Words", self.words_edit)
+        layout.addRow(buttons)
+
+    def language(self) -> str | None:
+        return self.language_box.currentData()
+
+    def provider(self) -> str | None:
+        return self.provider_box.currentData()
+
+    def words(self) -> list[str] | None:
+        words = [line.strip() for line in self.words_edit.toPlainText().splitlines() if line.strip()]
+        return words or None
+
+
+def export_sentence_pack() -> None:
+    dialog = ExportPackDialog(
+        mw,
+        get_db().get_cached_languages(),
+        [(provider.name, provider.human_name) for provider in get_providers()],
+    )
+    if not dialog.exec():
+        return
+    language, provider, words = dialog.language(), dialog.provider(), dialog.words()
+    path = getSaveFile(mw, "Export sentence pack", "incontext_pack", "Sentence pack", ".icpack", "sentences.icpack")
+    if not path:
+        return
+
+    def op(col: Collection) -> int:
+        return export_pack(get_db(), Path(path), language, provider, words)
+
+    AddonQueryOp(
+        parent=mw,
+        op=op,
+        success=lambda count: tooltip(f"Exported {count} sentences", parent=mw),
+    ).failure(on_failure).without_collection().with_progress("Exporting sentences...").run_in_background()
+
+
+def import_sentence_pack() -> None:
+    path = getFile(mw, "Import sentence pack", None, "Sentence pack (*.icpack)", key="incontext_pack")
+    if not path or not isinstance(path, str):
+        return
+
+    def op(col: Collection) -> int:
+        return import_pack(get_db(), Path(path))
+
+    AddonQueryOp(
+        parent=mw,
+        op=op,
+        success=lambda count: tooltip(f"Imported {count} sentences", parent=mw),
+    ).failure(on_failure).without_collection().with_progress("Importing sentences...").run_in_background()
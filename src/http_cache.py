@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import dataclasses
+import sqlite3
+import time
+import zlib
+from pathlib import Path
+from threading import Lock
+from types import TracebackType
+
+from .consts import consts
+
+
+@dataclasses.dataclass
+class CachedResponse:
+    url: str
+    content: bytes
+    etag: str | None = None
+    last_modified: str | None = None
+
+
+class HTTPCache:
+    """Stores response bodies along with their validators so that pages can be revalidated
+    with conditional requests instead of being downloaded again.
+
+    Bodies are stored compressed, and the least recently used entries are evicted once
+    the total compressed size exceeds `max_size` bytes.
+    """
+
+    def __init__(self, path: Path | None = None, max_size: int = 50 * 1024 * 1024):
+        self.max_size = max_size
+        self.con = sqlite3.connect(path or consts.dir / "user_files" / "http_cache.db", check_same_thread=False)
+        self.lock = Lock()
+        with self.con:
+            self.con.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS responses (
+                    url TEXT PRIMARY KEY,
+                    etag TEXT,
+                    last_modified TEXT,
+                    content BLOB,
+                    size INTEGER,
+                    accessed_at INTEGER
+                );
+                CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at);
+                """
+            )
+
+    def close(self) -> None:
+        self.con.close()
+
+    def __enter__(self) -> HTTPCache:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type | None,
+        exc_value: Exception | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+    def get(self, url: str) -> CachedResponse | None:
+        with self.lock:
+            row = self.con.execute(
+                "SELECT etag, last_modified, content FROM responses WHERE url = ?",
+                (url,),
+            ).fetchone()
+        if not row:
+            return None
+        etag, last_modified, content = row
+        return CachedResponse(url, zlib.decompress(content), etag, last_modified)
+
+    def touch(self, url: str) -> None:
+        with self.lock, self.con:
+            self.con.execute("UPDATE responses SET accessed_at = ? WHERE url = ?", (time.time_ns(), url))
+
+    def put(self, response: CachedResponse) -> None:
+        content = zlib.compress(response.content)
+        if len(content) > self.max_size:
+            return
+        with self.lock, self.con:
+            self.con.execute(
+                """
+                INSERT OR REPLACE INTO responses (url, etag, last_modified, content, size, accessed_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                (response.url, response.etag, response.last_modified, content, len(content), time.time_ns()),
+            )
+            self._evict()
+
+    def _evict(self) -> None:
+        # Keep the most recently used entries whose running total size fits in the budget
+        self.con.execute(
+            """
+            DELETE FROM responses WHERE url IN (
+                SELECT url FROM (
+                    SELECT url, SUM(size) OVER (ORDER BY accessed_at DESC, url) AS running_size FROM responses
+                ) WHERE running_size > ?
+            )
+            """,
+            (self.max_size,),
+        )
@@ -5,7 +5,7 @@ from .patches import patch_certifi
 patch_certifi()
 
 # ruff: noqa: E402
-from . import browser, menu, session, shortcuts, template_filter
+from . import browser, menu, prefetch, session, shortcuts, template_filter
 from .backend.server import init_server
 from .config import config
 from .consts import consts
@@ -17,7 +17,9 @@ def init() -> None:
     setup_error_handler()
     init_server()
     session.init_db()
+    session.init_hooks()
     template_filter.init_hooks()
+    prefetch.init_hooks()
     updates.init_hooks(consts, config)
     browser.init_hooks()
     shortcuts.init_hooks()
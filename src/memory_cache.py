@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from collections.abc import Hashable
+from threading import Lock
+from typing import Any
+
+# Returned by LRUCache.get() on a miss, since None is a valid cached value
+MISSING: Any = object()
+
+
+class LRUCache:
+    """A thread-safe in-memory cache bounded by both entry count and total size, evicting the least recently
+    used entries first.
+
+    Sizes are whatever the caller passes to `put()`. To avoid caching values read before a concurrent
+    invalidation, readers take a `generation()` before loading a value and pass it to `put()`, which
+    drops the value if anything was invalidated in between.
+    """
+
+    def __init__(self, max_entries: int = 1000, max_size: int = 16 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[Hashable, tuple[Any, int]] = OrderedDict()
+        self._generation = 0
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, key: Hashable) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISSING
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any, size: int, generation: int | None = None) -> None:
+        if size > self.max_size:
+            return
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+            self._entries[key] = (value, size)
+            self.size += size
+            while len(self._entries) > self.max_entries or self.size > self.max_size:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.size -= evicted_size
+
+    def invalidate(self, *keys: Hashable) -> None:
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                old = self._entries.pop(key, None)
+                if old is not None:
+                    self.size -= old[1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries), "size": self.size}
@@ -5,6 +5,7 @@ from .errors import upload_logs_and_notify_user
 from .gui.browse import BrowseDialog
 from .gui.help import HelpDialog
 from .gui.languages import LanguagesDialog
+from .gui.packs import export_sentence_pack, import_sentence_pack
 from .gui.settings import SettingsDialog
 from .gui.tatoeba import TatoebaDialog
 
@@ -47,6 +48,8 @@ def init() -> None:
     languages_action = QAction("Languages", mw)
     qconnect(languages_action.triggered, open_languages_dialog)
     menu.addAction(languages_action)
+    menu.addAction("Export sentence pack", export_sentence_pack)
+    menu.addAction("Import sentence pack", import_sentence_pack)
     menu.addAction("Upload logs", on_upload_logs)
     menu.addAction("Help", on_help)
     mw.form.menuTools.addMenu(menu)
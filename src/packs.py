@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import time
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+
+from .db import Sentence, SentenceDB
+from .exceptions import InContextInvalidPackError, InContextUnsupportedPackVersionError
+
+# Sentence packs are single-file exports of SentenceDB contents, for warming the cache on other machines.
+# A pack is a gzip-compressed JSON lines file: a header line, one [text, word, language, provider, source, fetched_at]
+# array per sentence, and a footer with the sentence count and the SHA-256 checksum of all preceding lines.
+PACK_FORMAT = "incontext-sentence-pack"
+PACK_VERSION = 1
+IMPORT_BATCH_SIZE = 10_000
+
+
+def _dump_line(value: object) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode() + b"\n"
+
+
+def export_pack(
+    db: SentenceDB,
+    path: Path,
+    language: str | None = None,
+    provider: str | None = None,
+    words: Iterable[str] | None = None,
+) -> int:
+    """Write the cached sentences matching the filters to a pack at `path`. Returns the number of sentences."""
+    checksum = hashlib.sha256()
+    count = 0
+    with gzip.open(path, "wb") as file:
+        header = _dump_line({"format": PACK_FORMAT, "version": PACK_VERSION, "created_at": time.time()})
+        file.write(header)
+        checksum.update(header)
+        for row in db.iter_export_rows(language, provider, words):
+            line = _dump_line(row)
+            file.write(line)
+            checksum.update(line)
+            count += 1
+        file.write(_dump_line({"count": count, "sha256": checksum.hexdigest()}))
+    return count
+
+
+def _read_pack(path: Path) -> Iterator[tuple[Sentence, float]]:
+    checksum = hashlib.sha256()
+    footer = None
+    count = 0
+    try:
+        with gzip.open(path, "rb") as file:
+            header = file.readline()
+            checksum.update(header)
+            info = json.loads(header)
+            if not isinstance(info, dict) or info.get("format") != PACK_FORMAT:
+                raise InContextInvalidPackError()
+            if info.get("version", 0) > PACK_VERSION:
+                raise InContextUnsupportedPackVersionError(info["version"])
+            for line in file:
+                row = json.loads(line)
+                if isinstance(row, dict):
+                    footer = row
+                    break
+                checksum.update(line)
+                count += 1
+                text, word, language, provider, source, fetched_at = row
+                yield Sentence(text, word, language, provider, source), fetched_at
+            if file.read(1):
+                raise InContextInvalidPackError()
+    except (OSError, EOFError, ValueError, TypeError) as exc:
+        raise InContextInvalidPackError() from exc
+    if not footer or footer.get("sha256") != checksum.hexdigest() or footer.get("count") != count:
+        raise InContextInvalidPackError()
+
+
+def verify_pack(path: Path) -> int:
+    """Check the pack's format and checksum without importing it. Returns the number of sentences."""
+    return sum(1 for _ in _read_pack(path))
+
+
+def import_pack(db: SentenceDB, path: Path) -> int:
+    """Merge the sentences in a pack into the database, keeping sentences that are already cached.
+
+    The pack is verified in full before anything is written. Returns the number of sentences in the pack.
+    """
+    count = verify_pack(path)
+    batch: list[tuple[Sentence, float]] = []
+    for item in _read_pack(path):
+        batch.append(item)
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            db.merge_sentences(batch)
+            batch = []
+    if batch:
+        db.merge_sentences(batch)
+    return count
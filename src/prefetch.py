@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextvars import ContextVar
+from dataclasses import dataclass
+from threading import Lock
+
+from anki.cards import Card
+from aqt import gui_hooks, mw
+
+from .config import config
+from .exceptions import InContextError
+from .gui.operations import run_task_in_background
+from .log import logger
+from .providers import match_providers
+
+
+@dataclass(frozen=True)
+class PrefetchRequest:
+    word: str
+    language: str | None
+    providers: tuple[str, ...] | None
+
+
+# Bounds how many provider fetches run for upcoming cards at the same time. Prefetching queries providers
+# one by one from these threads and stays off the shared fetch pool, so it can't crowd out the lookups
+# of the card that is being shown.
+MAX_CONCURRENT_PREFETCHES = 2
+_prefetch_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_PREFETCHES, thread_name_prefix="incontext-prefetch")
+_pending: set[PrefetchRequest] = set()
+_pending_lock = Lock()
+
+# Set while rendering upcoming cards, so that the template filter records its lookups here instead of running them
+_collected_requests: ContextVar[list[PrefetchRequest] | None] = ContextVar("_collected_requests", default=None)
+
+
+def collected_requests() -> list[PrefetchRequest] | None:
+    """Return the list to record lookups in if cards are currently being rendered for prefetching."""
+    return _collected_requests.get()
+
+
+def upcoming_cards(current_card_id: int, limit: int) -> list[Card]:
+    get_queued_cards = getattr(mw.col.sched, "get_queued_cards", None)
+    if get_queued_cards is None:
+        # Only the v3 scheduler can tell which cards come next
+        return []
+    queued = get_queued_cards(fetch_limit=limit + 1)
+    cards = [Card(mw.col, backend_card=queued_card.card) for queued_card in queued.cards]
+    return [card for card in cards if card.id != current_card_id][:limit]
+
+
+def collect_requests(cards: list[Card]) -> list[PrefetchRequest]:
+    """Render the cards to find out which words their InContext fields will look up."""
+    requests: list[PrefetchRequest] = []
+    token = _collected_requests.set(requests)
+    try:
+        for card in cards:
+            card.render_output(reload=True)
+    finally:
+        _collected_requests.reset(token)
+    return list(dict.fromkeys(requests))
+
+
+def prefetch(request: PrefetchRequest) -> None:
+    with _pending_lock:
+        if request in _pending:
+            return
+        _pending.add(request)
+
+    def task() -> None:
+        try:
+            language, providers = match_providers(
+                request.language, list(request.providers) if request.providers else None
+            )
+            # Fetch from all providers, since the card picks one of them at random when it's shown
+            for provider in providers:
+                try:
+                    provider.get_sentences(request.word.strip(), language)
+                except InContextError:
+                    logger.exception("Provider failed", name=provider.human_name, word=request.word, language=language)
+        except Exception:
+            logger.exception("Failed to prefetch sentences", word=request.word, language=request.language)
+        finally:
+            with _pending_lock:
+                _pending.discard(request)
+
+    _prefetch_executor.submit(task)
+
+
+def on_reviewer_did_show_question(card: Card) -> None:
+    limit = config["prefetch_cards"]
+    if limit <= 0:
+        return
+
+    def task() -> list[PrefetchRequest]:
+        return collect_requests(upcoming_cards(card.id, limit))
+
+    def on_done(future: Future) -> None:
+        try:
+            requests = future.result()
+        except Exception:
+            logger.exception("Failed to find sentences to prefetch")
+            return
+        for request in requests:
+            prefetch(request)
+
+    run_task_in_background(task, on_done)
+
+
+def init_hooks() -> None:
+    gui_hooks.reviewer_did_show_question.append(on_reviewer_did_show_question)
@@ -1,22 +1,28 @@
 from __future__ import annotations
 
+import concurrent.futures
+import contextvars
 import random
+from concurrent.futures import ThreadPoolExecutor
+from threading import RLock
+from typing import Any
 
+from ..cancellation import current_token
 from ..config import config
 from ..db import Sentence, SentenceDB
-from ..exceptions import InContextError, InContextFetchError
+from ..exceptions import InContextCancelledError, InContextError, InContextFetchError
 from ..log import logger
 from .dictionary_com import DictionaryProvider
 from .glosbe import GlosbeProvider
 from .jisho import JishoProvider
-from .langs import get_language_info, langcode_to_name
+from .langs import get_language_info, langcode_to_name, language_keys
 from .massif import MassifProvider
 from .nadeshiko import NadeshikoProvider
 from .oxford_learner import OxfordLearnerProvider
 from .provider import SentenceProvider
 from .seslisozluk import SesliSozlukProvider
 from .skell import SkellProvider
-from .tatoeba import TatoebaProvider
+from .tatoeba import TatoebaProvider, language_registry
 from .tdk import TDKProvider
 
 PROVIDER_CLASSES: list[type[SentenceProvider]] = [
@@ -32,12 +38,69 @@ PROVIDER_CLASSES: list[type[SentenceProvider]] = [
     NadeshikoProvider,
 ]
 PROVIDERS: list[SentenceProvider] = []
+# Bounds how many providers are queried at the same time across all requests
+MAX_CONCURRENT_FETCHES = 8
+_fetch_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_FETCHES, thread_name_prefix="incontext-fetch")
+
+# Lookup tables derived from PROVIDERS by build_routes(). They are replaced as a whole
+# on every rebuild, so readers never see a partially built table.
+LANGUAGE_ROUTES: dict[str, list[SentenceProvider]] = {}
+PROVIDERS_BY_NAME: dict[str, SentenceProvider] = {}
+LANGUAGES: list[tuple[str, str]] = []
+_routes_lock = RLock()
 
 
 def init_providers(db: SentenceDB) -> None:
     PROVIDERS.clear()
     for cls in PROVIDER_CLASSES:
         PROVIDERS.append(cls(db, config.get("provider_options", {}).get(cls.name, {})))
+    build_routes()
+
+
+def build_routes() -> None:
+    """Map every code and name of each supported language to the providers supporting it."""
+    global LANGUAGE_ROUTES, PROVIDERS_BY_NAME, LANGUAGES
+
+    with _routes_lock:
+        routes: dict[str, list[SentenceProvider]] = {}
+        codes: set[str] = set()
+        for provider in PROVIDERS:
+            for code in provider.supported_languages:
+                codes.add(code)
+                for key in language_keys(code):
+                    providers = routes.setdefault(key, [])
+                    if provider not in providers:
+                        providers.append(provider)
+        LANGUAGE_ROUTES = routes
+        PROVIDERS_BY_NAME = {provider.name: provider for provider in PROVIDERS}
+        LANGUAGES = [(code, langcode_to_name(code)) for code in codes]
+
+
+# Installing or removing Tatoeba databases changes the languages the Tatoeba provider supports
+language_registry.add_listener(build_routes)
+
+
+def _providers_for_language(language: str) -> list[SentenceProvider]:
+    # Picks up Tatoeba databases added or removed behind our back
+    language_registry.validate()
+    return LANGUAGE_ROUTES.get(language, [])
+
+
+def match_providers(
+    language: str | None = None, providers: list[str] | None = None
+) -> tuple[str, list[SentenceProvider]]:
+    """Return the normalized language code and the providers to query for it, in random order."""
+    # Default to English if no language is given
+    if not language:
+        language = "eng"
+    language = get_language_info(language).alpha_3.lower()
+    matched_providers = [
+        provider_obj
+        for provider_obj in _providers_for_language(language)
+        if not providers or provider_obj.name in providers
+    ]
+    random.shuffle(matched_providers)
+    return language, matched_providers
 
 
 def get_sentences(
@@ -47,44 +110,64 @@ def get_sentences(
     limit: int | None = None,
 ) -> tuple[list[Sentence], list[InContextFetchError]]:
     word = word.strip()
-    # Default to English if no language is given
-    if not language:
-        language = "eng"
     if providers and len(providers) == 0:
         return [], []
-    language = get_language_info(language).alpha_3.lower()
-    matched_providers: list[SentenceProvider] = []
-    for provider_obj in PROVIDERS:
-        matched = True
-        if language:
-            matched &= (
-                language in provider_obj.supported_languages
-                or langcode_to_name(language) in provider_obj.supported_languages
-            )
-        if providers:
-            matched &= provider_obj.name in providers
-        if matched:
-            matched_providers.append(provider_obj)
-    random.shuffle(matched_providers)
+    language, matched_providers = match_providers(language, providers)
     sentences: list[Sentence] = []
     errors: list[InContextFetchError] = []
-    while matched_providers and (not limit or len(sentences) < limit):
-        chosen_provider = matched_providers.pop()
-        try:
-            sentences.extend(chosen_provider.get_sentences(word, language, limit))
-        except InContextError as exc:
-            logger.exception("Provider failed", name=chosen_provider.human_name, word=word, language=language)
-            errors.append(InContextFetchError(exc, chosen_provider.name))
+    # Query all matched providers at once and take results as they come in, so that the total
+    # time is bounded by the slowest provider we wait for (or the deadline) rather than their sum
+    timeout = config["fetch_timeout"]
+    futures = {
+        # Run with a copy of the caller's context so that providers see its cancellation token
+        _fetch_executor.submit(
+            contextvars.copy_context().run, provider_obj.get_sentences, word, language, limit
+        ): provider_obj
+        for provider_obj in matched_providers
+    }
+    token = current_token()
+    try:
+        waited: list[concurrent.futures.Future[Any]] = [*futures, token.future] if token and futures else list(futures)
+        for completed, future in enumerate(concurrent.futures.as_completed(waited, timeout=timeout or None), 1):
+            if future not in futures:
+                # The caller no longer needs the results
+                raise InContextCancelledError()
+            chosen_provider = futures[future]
+            try:
+                sentences.extend(future.result())
+            except InContextCancelledError:
+                raise
+            except InContextError as exc:
+                logger.exception("Provider failed", name=chosen_provider.human_name, word=word, language=language)
+                errors.append(InContextFetchError(exc, chosen_provider.name))
+            # The cancellation future never completes otherwise, so stop once all providers are done
+            if completed == len(futures) or (limit and len(sentences) >= limit):
+                break
+    except concurrent.futures.TimeoutError:
+        errors.extend(_timeout_errors(futures, timeout, word, language))
+    finally:
+        # Providers that have not started yet are no longer needed
+        for future in futures:
+            future.cancel()
     if sentences and limit and len(sentences) > limit:
         sentences = random.sample(sentences, limit)
     return sentences, errors
 
 
+def _timeout_errors(
+    futures: dict[concurrent.futures.Future, SentenceProvider], timeout: float, word: str, language: str
+) -> list[InContextFetchError]:
+    errors = []
+    for future, provider_obj in futures.items():
+        if not future.done():
+            logger.warning("Provider timed out", name=provider_obj.human_name, word=word, language=language)
+            errors.append(InContextFetchError(InContextError(f"Timed out after {timeout} seconds"), provider_obj.name))
+    return errors
+
+
 def get_languages() -> list[tuple[str, str]]:
-    langs = set()
-    for provider in PROVIDERS:
-        langs.update(provider.supported_languages)
-    return [(code, langcode_to_name(code)) for code in langs]
+    language_registry.validate()
+    return list(LANGUAGES)
 
 
 def get_providers() -> list[SentenceProvider]:
@@ -92,15 +175,8 @@ def get_providers() -> list[SentenceProvider]:
 
 
 def get_providers_for_language(language: str) -> list[SentenceProvider]:
-    providers = []
-    for provider in PROVIDERS:
-        if language in provider.supported_languages:
-            providers.append(provider)
-    return providers
+    return list(_providers_for_language(language))
 
 
 def get_provider(name: str) -> SentenceProvider | None:
-    for provider in PROVIDERS:
-        if provider.name == name:
-            return provider
-    return None
+    return PROVIDERS_BY_NAME.get(name)
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import functools
+
 from ..vendor import pycountry
 
 # All languages supported by the add-on (https://downloads.tatoeba.org/exports/per_language/)
@@ -436,10 +438,12 @@ ALL_LANGS = [
 ]
 
 
+@functools.cache
 def get_language_info(lang_code: str) -> pycountry.db.Country | None:
     return pycountry.languages.get(alpha_2=lang_code) or pycountry.languages.get(alpha_3=lang_code)
 
 
+@functools.cache
 def langcode_to_name(lang_code: str) -> str:
     try:
         return get_language_info(lang_code).name
@@ -447,10 +451,30 @@ def langcode_to_name(lang_code: str) -> str:
         return lang_code
 
 
+@functools.cache
 def search_language(language: str) -> pycountry.db.Country | None:
     "Search for a language given its name or code"
     return pycountry.languages.lookup(language)
 
 
+@functools.cache
+def language_keys(language: str) -> frozenset[str]:
+    "Return the codes and name a language can be referred to by, given any of them"
+    try:
+        obj = search_language(language)
+    except LookupError:
+        obj = None
+    keys = {language}
+    if obj:
+        keys.update(getattr(obj, attr).lower() for attr in ("alpha_2", "alpha_3") if hasattr(obj, attr))
+        keys.add(obj.name)
+    return frozenset(keys)
+
+
+@functools.cache
+def _all_languages() -> tuple[tuple[str, str], ...]:
+    return tuple((code, langcode_to_name(code)) for code in ALL_LANGS)
+
+
 def get_all_languages() -> list[tuple[str, str]]:
-    return [(code, langcode_to_name(code)) for code in ALL_LANGS]
+    return list(_all_languages())
@@ -1,17 +1,35 @@
 from __future__ import annotations
 
 import random
+import time
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
+from threading import Lock
 from typing import Any, Generic, TypeVar, cast
 
-from ..db import Sentence, SentenceDB
-from ..exceptions import InContextUnsupportedLanguageError
+from ..cancellation import check_cancelled, current_token
+from ..config import config
+from ..db import FETCH_EMPTY, FETCH_ERROR, FETCH_OK, FetchStatus, Sentence, SentenceDB
+from ..exceptions import InContextCancelledError, InContextError, InContextUnsupportedLanguageError
+from ..log import logger
+from ..single_flight import SingleFlight
+
+# Upper bound for the backoff applied to repeated empty or failed fetches
+MAX_NEGATIVE_CACHE_TTL = 30 * 24 * 60 * 60
+
+# Refetches of stale cached sentences happen in the background, off the lookup path
+_refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="incontext-refresh")
+_refreshing: set[tuple[str, str, str]] = set()
+_refreshing_lock = Lock()
+# Concurrent lookups of the same word with the same provider share a single fetch
+_fetches: SingleFlight[list[Sentence]] = SingleFlight()
 
 
 @dataclass
 class ProviderConfig:
-    pass
+    # Time in seconds after which cached sentences are refetched in the background. 0 disables refetching.
+    cache_ttl: float = 30 * 24 * 60 * 60
 
 
 T = TypeVar("T", bound=ProviderConfig)
@@ -36,8 +54,7 @@ class SentenceProvider(Generic[T], ABC):
 
     def get_cached_sentences(self, word: str, language: str, limit: int | None = None) -> list[Sentence]:
         try:
-            with self.db.lock:
-                return self.db.get_random_sentences(word, language, self.name, limit)
+            return self.db.get_random_sentences(word, language, self.name, limit)
         except Exception:
             return []
 
@@ -58,16 +75,83 @@ class SentenceProvider(Generic[T], ABC):
             # Default to first supported language
             language = self.supported_languages[0]
         sentences.extend(self.get_cached_sentences(word, language, limit))
-        if not limit or len(sentences) < limit:
-            fetched = self.fetch(word, language)
-            if fetched:
-                with self.db.lock:
-                    self.db.add_sentences(fetched)
-                sentences.extend(fetched)
+        status = self.db.get_fetch_status(word, language, self.name)
+        if status and status.status == FETCH_OK and sentences:
+            # Everything the source had at the last fetch is already cached, so serve from the cache,
+            # and refresh it in the background once it's older than the configured TTL.
+            # Failed refreshes are retried with the same backoff as failed fetches.
+            ttl = self.negative_cache_ttl(status) if status.failures else self.config.cache_ttl
+            if self.config.cache_ttl and time.time() >= status.fetched_at + ttl:
+                self.schedule_refresh(word, language)
+        elif not limit or len(sentences) < limit:
+            if (
+                status
+                and status.status != FETCH_OK
+                and time.time() < status.fetched_at + self.negative_cache_ttl(status)
+            ):
+                # The last fetch came back empty or failed recently, so don't hit the source again yet
+                if status.status == FETCH_ERROR and not sentences:
+                    raise InContextError(status.error)
+                return sentences
+            sentences.extend(self.coalesced_fetch(word, language))
         if sentences and limit and len(sentences) > limit:
             sentences = random.sample(sentences, limit)
         return sentences
 
+    def coalesced_fetch(self, word: str, language: str) -> list[Sentence]:
+        while True:
+            check_cancelled()
+            try:
+                return _fetches.do((self.name, word, language), lambda: self.fetch_and_store(word, language))
+            except InContextCancelledError:
+                # The fetch we waited on was cancelled by whoever started it. Unless we were too, try again.
+                token = current_token()
+                if token and token.cancelled:
+                    raise
+
+    def fetch_and_store(self, word: str, language: str) -> list[Sentence]:
+        try:
+            fetched = self.fetch(word, language)
+        except InContextCancelledError:
+            raise
+        except InContextError as exc:
+            self.db.record_fetch(word, language, self.name, FETCH_ERROR, str(exc))
+            raise
+        check_cancelled()
+        if fetched:
+            self.db.add_sentences(fetched)
+        self.db.record_fetch(word, language, self.name, FETCH_OK if fetched else FETCH_EMPTY)
+        return fetched
+
+    def schedule_refresh(self, word: str, language: str) -> None:
+        key = (self.name, word, language)
+        with _refreshing_lock:
+            if key in _refreshing:
+                return
+            _refreshing.add(key)
+
+        def refresh() -> None:
+            try:
+                fetched = self.fetch(word, language)
+                if fetched:
+                    self.db.replace_sentences(word, language, self.name, fetched)
+                else:
+                    # Keep serving what we have rather than dropping it because of a transient empty result
+                    self.db.record_fetch(word, language, self.name, FETCH_OK)
+            except Exception as exc:
+                logger.exception("Failed to refresh sentences", name=self.human_name, word=word, language=language)
+                self.db.record_refresh_error(word, language, self.name, str(exc))
+            finally:
+                with _refreshing_lock:
+                    _refreshing.discard(key)
+
+        _refresh_executor.submit(refresh)
+
+    def negative_cache_ttl(self, status: FetchStatus) -> float:
+        """Return how long an empty or failed fetch is remembered, doubling with each consecutive one."""
+        base = config["negative_cache_ttl"] if status.status == FETCH_EMPTY else config["error_retry_delay"]
+        return min(base * 2 ** (status.failures - 1), MAX_NEGATIVE_CACHE_TTL)
+
     @abstractmethod
     def get_source(self, word: str, language: str) -> str:
         raise NotImplementedError(
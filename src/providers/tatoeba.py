@@ -1,20 +1,32 @@
 from __future__ import annotations
 
 import bz2
-import csv
+import codecs
+import itertools
+import os
+import re
 import sqlite3
-import tempfile
+import time
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
 from pathlib import Path
+from threading import Lock
 from types import TracebackType
-from typing import Callable
-
-import requests
+from typing import Any, Callable
 
 from ..consts import consts
-from ..db import Sentence
+from ..db import Sentence, SentenceDB
+from ..exceptions import InContextIncompleteDownloadError, InContextTatoebaDatabaseError
+from ..log import logger
+from ..request import TIMEOUT, get_session
 from .langs import get_language_info
 from .provider import SentenceProvider
 
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+INSERT_BATCH_SIZE = 10_000
+# Languages written without spaces between words, which are indexed by character n-grams instead of words
+CJK_LANGUAGES = {"jpn", "kor", "zho", "cmn", "yue", "wuu", "lzh", "gan", "hak", "hsn", "nan", "cjy"}
+
 
 def tatoeba_data_dir() -> Path:
     path = consts.dir / "user_files" / "tatoeba"
@@ -26,23 +38,100 @@ def tatoeba_db_path(language: str) -> Path:
     return tatoeba_data_dir() / f"{language}_sentences.db"
 
 
-def tatoeba_tsv_path(language: str) -> Path:
-    return tatoeba_data_dir() / f"{language}_sentences.tsv"
+def tatoeba_code(lang_code: str) -> str:
+    language = get_language_info(lang_code)
+    return language.alpha_3.lower() if language else lang_code
 
 
 class TatoebaDB:
-    def __init__(self, lang_code: str):
+    # Bumped whenever the on-disk layout changes; stored in SQLite's user_version
+    SCHEMA_VERSION = 3
+    # Sentence ids are Tatoeba's own ids for databases downloaded by this version, so refreshes
+    # can be applied as a delta. Databases migrated from older versions have locally assigned ids
+    # and are not marked as keyed in the meta table.
+    TABLES_SQL = """
+    CREATE TABLE IF NOT EXISTS sentences (id INTEGER PRIMARY KEY, text TEXT NOT NULL);
+    CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+    """
+    # The full-text index and the triggers keeping it in sync are created separately
+    # so that bulk loads can build them once after all rows are inserted
+    FTS_INDEXES_SQL = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS sentences_fts USING fts5(
+        text,
+        content='sentences',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 0'
+    );
+    CREATE TRIGGER IF NOT EXISTS sentences_ai AFTER INSERT ON sentences BEGIN
+        INSERT INTO sentences_fts(rowid, text) VALUES (new.id, new.text);
+    END;
+    CREATE TRIGGER IF NOT EXISTS sentences_ad AFTER DELETE ON sentences BEGIN
+        INSERT INTO sentences_fts(sentences_fts, rowid, text) VALUES ('delete', old.id, old.text);
+    END;
+    CREATE TRIGGER IF NOT EXISTS sentences_au AFTER UPDATE ON sentences BEGIN
+        INSERT INTO sentences_fts(sentences_fts, rowid, text) VALUES ('delete', old.id, old.text);
+        INSERT INTO sentences_fts(rowid, text) VALUES (new.id, new.text);
+    END;
+    """
+    REBUILD_FTS_INDEXES_SQL = """
+    INSERT INTO sentences_fts(sentences_fts) VALUES ('rebuild');
+    INSERT INTO sentences_fts(sentences_fts) VALUES ('optimize');
+    """
+    # CJK sentences are indexed by the n-gram tokens produced by cjk_ngrams(). The ascii tokenizer
+    # treats every non-ASCII character as part of a token, so each n-gram is kept as a single term.
+    NGRAM_INDEXES_SQL = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS sentences_ngrams USING fts5(grams, content='', tokenize='ascii');
+    CREATE TRIGGER IF NOT EXISTS sentences_ai AFTER INSERT ON sentences BEGIN
+        INSERT INTO sentences_ngrams(rowid, grams) VALUES (new.id, cjk_ngrams(new.text));
+    END;
+    CREATE TRIGGER IF NOT EXISTS sentences_ad AFTER DELETE ON sentences BEGIN
+        INSERT INTO sentences_ngrams(sentences_ngrams, rowid, grams) VALUES ('delete', old.id, cjk_ngrams(old.text));
+    END;
+    CREATE TRIGGER IF NOT EXISTS sentences_au AFTER UPDATE ON sentences BEGIN
+        INSERT INTO sentences_ngrams(sentences_ngrams, rowid, grams) VALUES ('delete', old.id, cjk_ngrams(old.text));
+        INSERT INTO sentences_ngrams(rowid, grams) VALUES (new.id, cjk_ngrams(new.text));
+    END;
+    """
+    REBUILD_NGRAM_INDEXES_SQL = """
+    INSERT INTO sentences_ngrams(sentences_ngrams) VALUES ('delete-all');
+    INSERT INTO sentences_ngrams(rowid, grams) SELECT id, cjk_ngrams(text) FROM sentences;
+    INSERT INTO sentences_ngrams(sentences_ngrams) VALUES ('optimize');
+    """
+    DROP_INDEXES_SQL = """
+    DROP TRIGGER IF EXISTS sentences_ai;
+    DROP TRIGGER IF EXISTS sentences_ad;
+    DROP TRIGGER IF EXISTS sentences_au;
+    DROP TABLE IF EXISTS sentences_fts;
+    DROP TABLE IF EXISTS sentences_ngrams;
+    """
+
+    def __init__(self, lang_code: str, path: Path | None = None, bulk: bool = False, readonly: bool = False):
         self.language = get_language_info(lang_code)
         self.alpha_3 = self.language.alpha_3.lower() if self.language else lang_code
         self.alpha_2 = (
             self.language.alpha_2.lower() if self.language and hasattr(self.language, "alpha_2") else lang_code
         )
-        self.conn = sqlite3.connect(tatoeba_db_path(self.alpha_3), check_same_thread=False)
-        self.conn.executescript(
-            """
-            CREATE TABLE IF NOT EXISTS sentences (text TEXT);
-            """
-        )
+        self.bulk = bulk
+        self.updating = False
+        self.changed_count = 0
+        self.removed_count = 0
+        path = path or tatoeba_db_path(self.alpha_3)
+        if readonly:
+            if not path.exists():
+                raise FileNotFoundError(path)
+            self.conn = sqlite3.connect(f"{path.resolve().as_uri()}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.create_function("cjk_ngrams", 1, cjk_ngrams, deterministic=True)
+        # Outdated databases are searched without their indexes until upgrade_database() has rebuilt them
+        self.outdated = False
+        if readonly:
+            self.outdated = self.needs_upgrade()
+            return
+        if bulk:
+            self._begin_bulk_load()
+        else:
+            self._open_or_create_db()
 
     def __enter__(self) -> TatoebaDB:
         return self
@@ -55,71 +144,468 @@ class TatoebaDB:
     ) -> None:
         self.conn.close()
 
-    def add_sentences(self, sentences: list[str]) -> None:
-        self.conn.executemany(
+    @classmethod
+    @contextmanager
+    def bulk_load(
+        cls, lang_code: str, before_replace: Callable[[], None] | None = None, keyed: bool = True
+    ) -> Iterator[TatoebaDB]:
+        """Build a fresh database in a temporary file and atomically move it into place once fully indexed.
+
+        Readers keep seeing the previous database until the swap, and an interrupted import
+        only leaves behind a temporary file that is discarded by the next one.
+        `keyed` tells whether the sentence ids are Tatoeba's own.
+        """
+        path = tatoeba_db_path(tatoeba_code(lang_code))
+        temp_path = path.with_name(path.name + ".tmp")
+        temp_path.unlink(missing_ok=True)
+        db = cls(lang_code, path=temp_path, bulk=True)
+        try:
+            yield db
+            db._finish_bulk_load(keyed)
+        except BaseException:
+            db.conn.close()
+            temp_path.unlink(missing_ok=True)
+            raise
+        db.conn.close()
+        # Writes were not synced during the load, so flush them before the file becomes visible
+        with open(temp_path, "rb+") as file:
+            os.fsync(file.fileno())
+        if before_replace:
+            before_replace()
+        os.replace(temp_path, path)
+
+    def _begin_bulk_load(self) -> None:
+        # The file is thrown away on failure, so durability guarantees are not needed until the swap
+        self.conn.executescript(
+            """
+            PRAGMA journal_mode = OFF;
+            PRAGMA synchronous = OFF;
+            PRAGMA locking_mode = EXCLUSIVE;
+            PRAGMA temp_store = MEMORY;
+            PRAGMA cache_size = -65536;
             """
-            INSERT INTO sentences (text) VALUES (?)
-            """,
-            [(sentence,) for sentence in sentences],
         )
+        self.conn.executescript(self.TABLES_SQL)
+
+    def _finish_bulk_load(self, keyed: bool) -> None:
         self.conn.commit()
+        self._build_indexes()
+        self.conn.executescript(
+            f"""
+            INSERT OR REPLACE INTO meta (key, value) VALUES ('keyed', '{int(keyed)}');
+            ANALYZE;
+            PRAGMA user_version = {self.SCHEMA_VERSION};
+            """
+        )
+
+    @property
+    def is_cjk(self) -> bool:
+        return self.alpha_3 in CJK_LANGUAGES
+
+    def _indexes_sql(self) -> str:
+        if self.is_cjk:
+            return self.NGRAM_INDEXES_SQL + self.REBUILD_NGRAM_INDEXES_SQL
+        return self.FTS_INDEXES_SQL + self.REBUILD_FTS_INDEXES_SQL
+
+    def _build_indexes(self) -> None:
+        self.conn.executescript(self._indexes_sql())
+
+    def _schema_version(self) -> int:
+        return self.conn.execute("PRAGMA user_version").fetchone()[0]
+
+    def needs_upgrade(self) -> bool:
+        return self._schema_version() != self.SCHEMA_VERSION
+
+    def _open_or_create_db(self) -> None:
+        version = self._schema_version()
+        if version == self.SCHEMA_VERSION:
+            return
+        legacy = (
+            version == 0
+            and self.conn.execute(
+                "SELECT null FROM sqlite_master WHERE type = 'table' AND name = 'sentences'"
+            ).fetchone()
+            is not None
+        )
+        # Databases created by older versions only have a bare text column and no index
+        script = "BEGIN;"
+        if legacy:
+            script += "ALTER TABLE sentences RENAME TO legacy_sentences;"
+        script += self.TABLES_SQL
+        if legacy:
+            script += """
+            INSERT INTO sentences (text) SELECT text FROM legacy_sentences WHERE text IS NOT NULL;
+            DROP TABLE legacy_sentences;
+            """
+        # CJK databases before version 3 were given a word index that is useless for them
+        if version < 1 or (version < 3 and self.is_cjk):
+            script += self.DROP_INDEXES_SQL + self._indexes_sql()
+        script += f"PRAGMA user_version = {self.SCHEMA_VERSION}; COMMIT;"
+        self.conn.executescript(script)
+
+    def is_keyed(self) -> bool:
+        # Legacy databases don't have a meta table
+        if not self.conn.execute("SELECT null FROM sqlite_master WHERE type = 'table' AND name = 'meta'").fetchone():
+            return False
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'keyed'").fetchone()
+        return row is not None and row[0] == "1"
+
+    @contextmanager
+    def delta_update(self) -> Iterator[TatoebaDB]:
+        """Apply a full export as a delta. Rows passed to add_sentences() are staged in a temporary table,
+        and when the block exits, changed rows are upserted and rows missing from the export are deleted.
+
+        Only that last step writes to the database, in one short transaction, so lookups aren't locked out
+        while the export is downloaded.
+        """
+        self.conn.executescript(
+            """
+            DROP TABLE IF EXISTS temp.staged_sentences;
+            CREATE TEMP TABLE staged_sentences (id INTEGER PRIMARY KEY, text TEXT NOT NULL);
+            """
+        )
+        self.updating = True
+        self.changed_count = self.removed_count = 0
+        try:
+            yield self
+            self.conn.execute("BEGIN IMMEDIATE")
+            # Unchanged rows are left alone so that refreshes only touch the full-text index for the delta
+            self.changed_count = self.conn.execute(
+                """
+                INSERT INTO sentences (id, text) SELECT id, text FROM temp.staged_sentences WHERE true
+                ON CONFLICT (id) DO UPDATE SET text = excluded.text WHERE text != excluded.text
+                """
+            ).rowcount
+            self.removed_count = self.conn.execute(
+                "DELETE FROM sentences WHERE id NOT IN (SELECT id FROM temp.staged_sentences)"
+            ).rowcount
+            self.conn.commit()
+        except BaseException:
+            self.conn.rollback()
+            raise
+        finally:
+            self.updating = False
+            self.conn.executescript("DROP TABLE IF EXISTS temp.staged_sentences;")
+
+    def add_sentences(self, sentences: list[tuple[int, str]]) -> None:
+        if self.updating:
+            self.conn.executemany("INSERT OR REPLACE INTO temp.staged_sentences (id, text) VALUES (?, ?)", sentences)
+            self.conn.commit()
+            return
+        self.changed_count += self.conn.executemany(
+            """
+            INSERT INTO sentences (id, text) VALUES (?, ?)
+            ON CONFLICT (id) DO UPDATE SET text = excluded.text WHERE text != excluded.text
+            """,
+            sentences,
+        ).rowcount
+        # Bulk loads are committed as a single transaction at the end
+        if not self.bulk:
+            self.conn.commit()
 
     def get_sentences(self, word: str) -> list[str]:
         params: tuple[str, ...]
-        if self.alpha_2 in ("ja", "ko", "zh"):
-            # TODO: use a proper tokenizer/morphemizer for CJK languages
+        if self.outdated:
             query = "SELECT text FROM sentences WHERE text LIKE ?"
             params = (f"%{word}%",)
+        elif self.is_cjk:
+            match = cjk_ngram_query(word)
+            if match:
+                # The n-gram index narrows down candidates, which are then checked for the actual substring
+                query = """
+                SELECT s.text FROM sentences_ngrams JOIN sentences s ON s.id = sentences_ngrams.rowid
+                WHERE sentences_ngrams MATCH ? AND instr(lower(s.text), lower(?)) > 0
+                """
+                params = (match, word)
+            else:
+                query = "SELECT text FROM sentences WHERE text LIKE ?"
+                params = (f"%{word}%",)
         else:
-            query = """
-            SELECT text FROM sentences WHERE
-            text LIKE ? OR text LIKE ? OR text LIKE ? OR text LIKE ?
-            """
-            params = (
-                f"{word} %",
-                f"% {word}",
-                f"% {word} %",
-                word,
-            )
+            if not word.strip():
+                return []
+            # Match the word (or words) as a phrase of whole tokens using the full-text index
+            query = "SELECT text FROM sentences_fts WHERE sentences_fts MATCH ?"
+            params = ('"' + word.replace('"', '""') + '"',)
 
         return [row[0] for row in self.conn.execute(query, params)]
 
 
+class TatoebaConnectionPool:
+    """Keeps read-only connections to each language database open between lookups, so that
+    lookups don't pay for opening the database and warming up SQLite's page cache every time.
+
+    Writes to a language database must happen inside writer(), which serializes them and makes
+    sure no reader keeps using a database file that has been replaced.
+    """
+
+    def __init__(self, max_idle_readers: int = 4):
+        self.max_idle_readers = max_idle_readers
+        self._lock = Lock()
+        self._idle_readers: dict[str, list[TatoebaDB]] = {}
+        self._generations: dict[str, int] = {}
+        self._write_locks: dict[str, Lock] = {}
+
+    @contextmanager
+    def reader(self, lang_code: str) -> Iterator[TatoebaDB]:
+        alpha_3 = tatoeba_code(lang_code)
+        with self._lock:
+            generation = self._generations.get(alpha_3, 0)
+            idle_readers = self._idle_readers.setdefault(alpha_3, [])
+            db = idle_readers.pop() if idle_readers else None
+        if db is None:
+            db = TatoebaDB(alpha_3, readonly=True)
+        try:
+            yield db
+        finally:
+            with self._lock:
+                reusable = self._generations.get(alpha_3, 0) == generation and len(idle_readers) < self.max_idle_readers
+                if reusable:
+                    idle_readers.append(db)
+            if not reusable:
+                db.conn.close()
+
+    @contextmanager
+    def writer(self, lang_code: str) -> Iterator[None]:
+        alpha_3 = tatoeba_code(lang_code)
+        with self._lock:
+            write_lock = self._write_locks.setdefault(alpha_3, Lock())
+        with write_lock:
+            try:
+                yield
+            finally:
+                self.invalidate(alpha_3)
+
+    def invalidate(self, lang_code: str) -> None:
+        """Close idle readers of a language and make sure readers in use are closed once returned."""
+        alpha_3 = tatoeba_code(lang_code)
+        with self._lock:
+            self._generations[alpha_3] = self._generations.get(alpha_3, 0) + 1
+            idle_readers = self._idle_readers.pop(alpha_3, [])
+        for db in idle_readers:
+            db.conn.close()
+
+    def close(self) -> None:
+        with self._lock:
+            languages = list(self._idle_readers)
+        for alpha_3 in languages:
+            self.invalidate(alpha_3)
+
+
+connection_pool = TatoebaConnectionPool()
+
+
+class TatoebaLanguageRegistry:
+    """In-memory list of the languages that have a downloaded Tatoeba database.
+
+    The data directory is scanned once and then only rescanned when its mtime changes,
+    which is checked at most every `validate_interval` seconds.
+    """
+
+    def __init__(self, validate_interval: float = 10.0):
+        self.validate_interval = validate_interval
+        self._lock = Lock()
+        self._languages: list[str] | None = None
+        self._mtime: float | None = None
+        self._last_validated = 0.0
+        self._listeners: list[Callable[[], None]] = []
+
+    def add_listener(self, listener: Callable[[], None]) -> None:
+        "Register a function to be called whenever the set of installed languages changes"
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def _notify(self) -> None:
+        for listener in self._listeners:
+            listener()
+
+    def validate(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            changed = False
+            if self._languages is None or now - self._last_validated >= self.validate_interval:
+                self._last_validated = now
+                if self._languages is None or self._data_dir_mtime() != self._mtime:
+                    changed = self._scan()
+        if changed:
+            self._notify()
+
+    def languages(self) -> list[str]:
+        self.validate()
+        with self._lock:
+            return list(self._languages)
+
+    def add(self, lang_code: str) -> None:
+        alpha_3 = tatoeba_code(lang_code)
+        with self._lock:
+            if self._languages is None:
+                self._scan()
+            changed = alpha_3 not in self._languages
+            if changed:
+                self._languages.append(alpha_3)
+        if changed:
+            self._notify()
+
+    def _data_dir_mtime(self) -> float | None:
+        try:
+            return os.stat(consts.dir / "user_files" / "tatoeba").st_mtime
+        except FileNotFoundError:
+            return None
+
+    def _scan(self) -> bool:
+        langs = []
+        for path in tatoeba_data_dir().iterdir():
+            if path.is_file() and path.suffix == ".db":
+                langs.append(path.stem.split("_")[0])
+        # The first scan is not a change, as nothing can have been derived from the registry before it
+        changed = self._languages is not None and sorted(langs) != sorted(self._languages)
+        self._languages = langs
+        self._mtime = self._data_dir_mtime()
+        return changed
+
+
+language_registry = TatoebaLanguageRegistry()
+
+
+def _alnum_runs(text: str) -> list[str]:
+    return re.findall(r"[^\W_]+", text)
+
+
+def cjk_ngrams(text: str) -> str:
+    """Return the space-separated n-gram tokens used to index CJK text.
+
+    Each run of letters and digits contributes its character bigrams followed by its last character,
+    so every character is the first character of some token and a substring of two or more characters
+    maps to consecutive tokens.
+    """
+    tokens: list[str] = []
+    for run in _alnum_runs(text.lower()):
+        tokens.extend(run[i : i + 2] for i in range(len(run) - 1))
+        tokens.append(run[-1])
+    return " ".join(tokens)
+
+
+def cjk_ngram_query(word: str) -> str | None:
+    """Build an FTS5 query that matches all sentences indexed by cjk_ngrams() that may contain the word."""
+    phrases = []
+    for run in _alnum_runs(word.lower()):
+        if len(run) == 1:
+            phrases.append(f'"{run}"*')
+        else:
+            phrases.append('"' + " ".join(run[i : i + 2] for i in range(len(run) - 1)) + '"')
+    return " AND ".join(phrases) or None
+
+
+def upgrade_database(lang_code: str) -> bool:
+    """Rebuild an outdated database in the current format. Returns whether it was outdated.
+
+    The new database is built in a temporary file, so lookups keep using the old one until it's swapped in.
+    """
+    alpha_3 = tatoeba_code(lang_code)
+    with connection_pool.writer(alpha_3):
+        with TatoebaDB(alpha_3, readonly=True) as old:
+            if not old.outdated:
+                return False
+            keyed = old.is_keyed()
+        with TatoebaDB.bulk_load(
+            alpha_3, before_replace=lambda: connection_pool.invalidate(alpha_3), keyed=keyed
+        ) as db:
+            with TatoebaDB(alpha_3, readonly=True) as old:
+                # Ids of databases that aren't keyed were assigned locally, and legacy databases have none
+                id_column = "id" if keyed else "NULL"
+                rows = old.conn.execute(f"SELECT {id_column}, text FROM sentences WHERE text IS NOT NULL")
+                while batch := rows.fetchmany(INSERT_BATCH_SIZE):
+                    db.add_sentences(batch)
+    return True
+
+
+def upgrade_databases() -> None:
+    """Upgrade the downloaded databases created by older versions. Meant to be run in the background."""
+    for lang_code in language_registry.languages():
+        try:
+            if upgrade_database(lang_code):
+                logger.info("Upgraded Tatoeba database", language=lang_code)
+        except (OSError, sqlite3.Error):
+            logger.exception("Failed to upgrade Tatoeba database", language=lang_code)
+
+
+def iter_tsv_rows(chunks: Iterable[bytes]) -> Iterator[list[str]]:
+    """Decompress a bzip2-compressed TSV stream and yield its rows as they become available."""
+    decompressor = bz2.BZ2Decompressor()
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending = ""
+    for chunk in chunks:
+        data = chunk
+        while data:
+            if decompressor.eof:
+                # Handle multi-stream archives
+                decompressor = bz2.BZ2Decompressor()
+            text = decoder.decode(decompressor.decompress(data))
+            data = decompressor.unused_data if decompressor.eof else b""
+            lines = (pending + text).split("\n")
+            pending = lines.pop()
+            for line in lines:
+                yield line.rstrip("\r").split("\t", 2)
+    if not decompressor.eof:
+        # The download was cut off. The last row may be cut too, so it's dropped rather than yielded.
+        raise InContextIncompleteDownloadError()
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.rstrip("\r").split("\t", 2)
+
+
+def parse_sentence_rows(rows: Iterable[list[str]]) -> list[tuple[int, str]]:
+    sentences = []
+    for row in rows:
+        if len(row) != 3 or not row[0].isdigit():
+            continue
+        sentences.append((int(row[0]), row[2]))
+    return sentences
+
+
 def download_tatoeba_sentences(lang_code: str, on_progress: Callable[[float, str, bool], None]) -> None:
     language = get_language_info(lang_code)
     alpha_3 = language.alpha_3.lower() if language else lang_code
-    chunk_size = 8192
-    with tempfile.NamedTemporaryFile() as bz2_file:
-        url = f"https://downloads.tatoeba.org/exports/per_language/{alpha_3}/{alpha_3}_sentences.tsv.bz2"
-        response = requests.get(url, stream=True)
+    language_name = language.name if language else lang_code
+    url = f"https://downloads.tatoeba.org/exports/per_language/{alpha_3}/{alpha_3}_sentences.tsv.bz2"
+    with get_session().get(url, stream=True, timeout=TIMEOUT) as response:
         response.raise_for_status()
-        for chunk in response.iter_content(chunk_size=chunk_size):
-            bz2_file.write(chunk)
-            on_progress(
-                bz2_file.tell() / int(response.headers["Content-Length"]),
-                f"Downloading Tatoeba sentences for {language.name}",
-                False,
-            )
-        bz2_file.seek(0)
-        decompressor = bz2.BZ2Decompressor()
-        with open(tatoeba_tsv_path(alpha_3), "wb") as tsv_file:
-            while True:
-                try:
-                    chunk = decompressor.decompress(bz2_file.read(), chunk_size)
-                    tsv_file.write(chunk)
-                    on_progress(
-                        tsv_file.tell() / bz2_file.tell(),
-                        f"Decompressing Tatoeba sentences for {language.name}",
-                        False,
-                    )
-                except EOFError:
-                    break
-        with open(tatoeba_tsv_path(alpha_3), encoding="utf-8", newline="") as tsv_file2:
-            with TatoebaDB(alpha_3) as db:
-                db.add_sentences(
-                    [row[2] for row in csv.reader(tsv_file2, delimiter="\t")],
+        total_size = int(response.headers.get("Content-Length", 0))
+        downloaded_size = 0
+
+        def iter_chunks() -> Iterator[bytes]:
+            nonlocal downloaded_size
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                downloaded_size += len(chunk)
+                on_progress(
+                    downloaded_size / total_size if total_size else 0.0,
+                    f"Downloading Tatoeba sentences for {language_name}",
+                    False,
+                )
+                yield chunk
+
+        rows = iter_tsv_rows(iter_chunks())
+        with connection_pool.writer(alpha_3):
+            # Checked on a read-only connection, so that outdated databases aren't upgraded just to be replaced
+            keyed = False
+            if tatoeba_db_path(alpha_3).exists():
+                with TatoebaDB(alpha_3, readonly=True) as existing:
+                    keyed = existing.is_keyed()
+            if keyed:
+                with TatoebaDB(alpha_3) as db, db.delta_update():
+                    while batch := list(itertools.islice(rows, INSERT_BATCH_SIZE)):
+                        db.add_sentences(parse_sentence_rows(batch))
+                message = (
+                    f"Finished updating Tatoeba sentences for {language_name} "
+                    f"({db.changed_count} added or changed, {db.removed_count} removed)"
                 )
-        on_progress(1.0, f"Finished downloading Tatoeba sentences for {language.name}", True)
+            else:
+                # Readers of the old file have to be closed before it can be replaced on Windows
+                with TatoebaDB.bulk_load(alpha_3, before_replace=lambda: connection_pool.invalidate(alpha_3)) as db:
+                    while batch := list(itertools.islice(rows, INSERT_BATCH_SIZE)):
+                        db.add_sentences(parse_sentence_rows(batch))
+                message = f"Finished downloading Tatoeba sentences for {language_name}"
+        language_registry.add(alpha_3)
+    on_progress(1.0, message, True)
 
 
 class TatoebaProvider(SentenceProvider):
@@ -127,22 +613,25 @@ class TatoebaProvider(SentenceProvider):
     human_name = "Tatoeba"
     url = "https://tatoeba.org"
 
+    def __init__(self, db: SentenceDB, config: dict[str, Any]):
+        super().__init__(db, config)
+        self.pool = connection_pool
+
     @property
     def supported_languages(self) -> list[str]:
-        langs = []
-        for path in tatoeba_data_dir().iterdir():
-            if path.is_file() and path.suffix == ".db":
-                langs.append(path.stem.split("_")[0])
-        return langs
+        return language_registry.languages()
 
     def fetch(self, word: str, language: str) -> list[Sentence]:
         sentences = super().fetch(word, language)
         word = word.lower()
         try:
-            with TatoebaDB(language) as db:
+            with self.pool.reader(language) as db:
                 sentences.extend(Sentence(sentence, word, language, self.name) for sentence in db.get_sentences(word))
         except FileNotFoundError:
             pass
+        except sqlite3.Error as exc:
+            # Such as a database that is locked by an update or corrupted, which only fails this provider
+            raise InContextTatoebaDatabaseError(language, exc) from exc
         return sentences
 
     def get_source(self, word: str, language: str) -> str:
@@ -1,24 +1,87 @@
 from __future__ import annotations
 
+from threading import Lock
+
 import requests
 from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
 
+from .cancellation import check_cancelled
+from .config import config
 from .exceptions import InContextError
+from .http_cache import CachedResponse, HTTPCache
 
 USER_AGENT = "Mozilla/5.0 (compatible; Anki)"
 HEADERS = {"User-Agent": USER_AGENT}
+TIMEOUT = 30
+# Number of hosts to keep connection pools for
+POOL_CONNECTIONS = 20
+
+_session: requests.Session | None = None
+_session_lock = Lock()
+_http_cache: HTTPCache | None = None
+_http_cache_lock = Lock()
+
+
+def get_session() -> requests.Session:
+    """Return the session shared by all requests made by the add-on.
+
+    Connections are kept alive in per-host pools, so repeated requests to the same site
+    skip the DNS lookup and TCP/TLS handshakes.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            session.headers.update(HEADERS)
+            adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=config["http_pool_size"])
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+
+def get_http_cache() -> HTTPCache | None:
+    global _http_cache
+    max_size = int(config["http_cache_size_mb"] * 1024 * 1024)
+    if max_size <= 0:
+        return None
+    with _http_cache_lock:
+        if _http_cache is None:
+            _http_cache = HTTPCache(max_size=max_size)
+        return _http_cache
 
 
-def make_request(url: str) -> requests.Response:
+def make_request(url: str, use_cache: bool = False) -> requests.Response:
+    cache = get_http_cache() if use_cache else None
+    cached = cache.get(url) if cache else None
+    headers = {}
+    if cached:
+        if cached.etag:
+            headers["If-None-Match"] = cached.etag
+        if cached.last_modified:
+            headers["If-Modified-Since"] = cached.last_modified
+    check_cancelled()
     try:
-        res = requests.get(url, headers=HEADERS, timeout=30)
+        res = get_session().get(url, headers=headers, timeout=TIMEOUT)
     except Exception as exc:
         raise InContextError(str(exc)) from exc
-    else:
-        return res
+    # Requests can't be interrupted, but their results don't need to be processed any further
+    check_cancelled()
+    if cache and cached and res.status_code == 304:
+        cache.touch(url)
+        res.status_code = 200
+        res._content = cached.content
+    elif cache and res.status_code == 200:
+        # Responses without validators can't be revalidated, so there is no point in storing them
+        etag = res.headers.get("ETag")
+        last_modified = res.headers.get("Last-Modified")
+        if etag or last_modified:
+            cache.put(CachedResponse(url, res.content, etag, last_modified))
+    return res
 
 
 def get_soup(url: str) -> BeautifulSoup:
-    res = make_request(url)
+    res = make_request(url, use_cache=True)
     soup = BeautifulSoup(res.content, "html.parser")
     return soup
@@ -1,17 +1,93 @@
 from __future__ import annotations
 
+from concurrent.futures import Future
+
+from anki.collection import Collection
+from aqt import gui_hooks, mw
+from aqt.qt import QTimer
+
+from .config import config
 from .db import SentenceDB
+from .gui.operations import AddonQueryOp, run_task_in_background
+from .log import logger
 from .providers import init_providers
+from .providers.tatoeba import upgrade_databases
+
+# Delay in milliseconds after the profile is opened before cache maintenance starts, to stay out of the way of startup
+MAINTENANCE_DELAY = 60 * 1000
+# Interval in milliseconds at which access times of looked up words are saved, for eviction to see them
+ACCESS_FLUSH_INTERVAL = 5 * 60 * 1000
 
 sentences_db: SentenceDB | None = None
+access_flush_timer: QTimer | None = None
 
 
 def init_db() -> None:
     global sentences_db
-    sentences_db = SentenceDB()
+    sentences_db = SentenceDB(
+        max_size=int(config["sentence_cache_size_mb"] * 1024 * 1024),
+        max_sentences=config["sentence_cache_max_sentences"],
+    )
     init_providers(sentences_db)
 
 
 def get_db() -> SentenceDB:
     assert sentences_db is not None, "DB not initialized"
     return sentences_db
+
+
+def on_maintenance_done(future: Future) -> None:
+    if exc := future.exception():
+        logger.error("Error maintaining sentence cache", exc_info=exc)
+
+
+def run_maintenance() -> None:
+    if get_db().needs_full_vacuum():
+        run_full_vacuum_when_idle()
+    run_task_in_background(get_db().maintain, on_done=on_maintenance_done, uses_collection=False)
+
+
+# Main window states in which nothing is being reviewed
+IDLE_STATES = ("deckBrowser", "overview")
+
+
+def run_full_vacuum_when_idle() -> None:
+    """Run the one-time full vacuum of old sentence caches with a progress window, once the user isn't reviewing."""
+    if mw.state not in IDLE_STATES:
+
+        def on_state_did_change(new_state: str, old_state: str) -> None:
+            if new_state in IDLE_STATES:
+                gui_hooks.state_did_change.remove(on_state_did_change)
+                run_full_vacuum_when_idle()
+
+        gui_hooks.state_did_change.append(on_state_did_change)
+        return
+
+    def op(col: Collection) -> None:
+        get_db().enable_incremental_vacuum()
+
+    AddonQueryOp(parent=mw, op=op, success=lambda _: None).failure(
+        lambda exc: logger.error("Error compacting sentence cache", exc_info=exc)
+    ).without_collection().with_progress("Compacting the InContext sentence cache...").run_in_background()
+
+
+def flush_access_times() -> None:
+    run_task_in_background(get_db().flush_access_times, on_done=on_maintenance_done, uses_collection=False)
+
+
+def on_profile_did_open() -> None:
+    global access_flush_timer
+    mw.progress.single_shot(MAINTENANCE_DELAY, run_maintenance, False)
+    # Tatoeba databases from older versions are searched without indexes until they're upgraded
+    run_task_in_background(upgrade_databases, on_done=on_maintenance_done, uses_collection=False)
+    if access_flush_timer is None:
+        access_flush_timer = mw.progress.timer(ACCESS_FLUSH_INTERVAL, flush_access_times, True, False, parent=mw)
+
+
+def on_profile_will_close() -> None:
+    get_db().flush_access_times()
+
+
+def init_hooks() -> None:
+    gui_hooks.profile_did_open.append(on_profile_did_open)
+    gui_hooks.profile_will_close.append(on_profile_will_close)
@@ -2,9 +2,12 @@ from __future__ import annotations
 
 import html
 import json
-from concurrent.futures import Future
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Any
+from threading import Lock
+from typing import Any, Callable
 
 from anki import hooks
 from anki.cards import Card
@@ -20,7 +23,9 @@ try:
 except ImportError:
     from aqt.previewer import Previewer  # type: ignore
 
-from .gui.operations import run_task_in_background
+from .cancellation import CancellationToken, run_with_token
+from .exceptions import InContextCancelledError
+from .prefetch import PrefetchRequest, collected_requests
 from .providers import get_provider, get_sentences
 
 WEB_BASE = f"/_addons/{mw.addonManager.addonFromModule(__name__)}/web"
@@ -66,7 +71,118 @@ def get_formatted_sentence(text: str, lang: str | None, providers: list[str] | N
     return f"{sentence.text if sentence else ''} {source}"
 
 
-incontext_id = 0
+# Lookups for shown cards run on their own workers. Those of the reviewer's card are cancelled when the reviewer
+# moves on to another card. Other views, like the previewer and the card layout screen, don't cancel theirs.
+MAX_CONCURRENT_LOOKUPS = 4
+_lookup_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_LOOKUPS, thread_name_prefix="incontext-lookup")
+# Cancellation tokens of the reviewer's cards
+_card_tokens: dict[int, CancellationToken] = {}
+_card_tokens_lock = Lock()
+
+
+def is_reviewer_card(card: Card | None) -> bool:
+    # The reviewer renders its own Card object, so other views showing the same card don't match
+    return card is not None and mw.state == "review" and card is mw.reviewer.card
+
+
+def run_lookup(
+    card_id: int, task: Callable[[], str], on_done: Callable[[Future], None], for_reviewer: bool = False
+) -> Future:
+    if for_reviewer:
+        with _card_tokens_lock:
+            token = _card_tokens.setdefault(card_id, CancellationToken())
+        future = _lookup_executor.submit(run_with_token, token, task)
+        # Lookups that haven't started yet are dropped right away
+        token.add_callback(future.cancel)
+    else:
+        future = _lookup_executor.submit(task)
+    when_done(future, on_done)
+    return future
+
+
+def when_done(future: Future, on_done: Callable[[Future], None]) -> None:
+    """Call `on_done` on the main thread once `future` completes, unless it was cancelled."""
+
+    def done(fut: Future) -> None:
+        if fut.cancelled() or isinstance(fut.exception(), InContextCancelledError):
+            return
+        mw.taskman.run_on_main(lambda: on_done(fut))
+
+    future.add_done_callback(done)
+
+
+def cancel_lookups(except_card_id: int | None = None) -> None:
+    with _card_tokens_lock:
+        stale = {card_id: token for card_id, token in _card_tokens.items() if card_id != except_card_id}
+        for card_id in stale:
+            del _card_tokens[card_id]
+    for token in stale.values():
+        token.cancel()
+
+
+# Results waiting to be sent to the webview, by filter ID along with their card ID. Results that come in
+# within DELIVERY_DELAY milliseconds of each other are sent together.
+DELIVERY_DELAY = 10
+_deliveries: dict[str, tuple[int, str]] = {}
+
+
+def deliver_sentence(card_id: int, filter_id: str, sentence: str) -> None:
+    if not _deliveries:
+        mw.progress.single_shot(DELIVERY_DELAY, flush_deliveries, False)
+    _deliveries[filter_id] = (card_id, sentence)
+
+
+def flush_deliveries() -> None:
+    deliveries = dict(_deliveries)
+    _deliveries.clear()
+    card_context = get_active_card_context()
+    if not card_context.card or not card_context.web:
+        return
+    sentences = {
+        filter_id: sentence for filter_id, (card_id, sentence) in deliveries.items() if card_id == card_context.card.id
+    }
+    if sentences:
+        card_context.web.eval(f"incontext.deliverSentences({json.dumps(sentences)});")
+
+
+# Lookups of recently shown cards, keyed by card ID, field name, filter options, field text, occurrence and whether
+# they're for the reviewer, so that the answer side shows the same sentence as the question side instead of looking
+# it up again. Other views don't share the reviewer's lookups, as those can be cancelled.
+ResultKey = tuple[int, str, str, str, int, bool]
+RESULT_TTL = 5 * 60
+MAX_REMEMBERED_RESULTS = 50
+_results: OrderedDict[ResultKey, tuple[float, Future]] = OrderedDict()
+# Maps filter IDs to the keys of their results, so that refreshed sentences replace the remembered ones
+_filter_result_keys: OrderedDict[str, ResultKey] = OrderedDict()
+_results_lock = Lock()
+
+
+def remember_result(key: ResultKey, future: Future, filter_id: str | None = None) -> None:
+    with _results_lock:
+        _results[key] = (time.monotonic(), future)
+        _results.move_to_end(key)
+        while len(_results) > MAX_REMEMBERED_RESULTS:
+            _results.popitem(last=False)
+        if filter_id is not None:
+            _filter_result_keys[filter_id] = key
+            while len(_filter_result_keys) > MAX_REMEMBERED_RESULTS:
+                _filter_result_keys.popitem(last=False)
+
+
+def remembered_result(key: ResultKey) -> Future | None:
+    with _results_lock:
+        entry = _results.get(key)
+        if not entry:
+            return None
+        remembered_at, future = entry
+        if (
+            time.monotonic() - remembered_at > RESULT_TTL
+            or future.cancelled()
+            or (future.done() and future.exception())
+        ):
+            del _results[key]
+            return None
+        return future
 
 
 def incontext_filter(
@@ -78,25 +194,49 @@ def incontext_filter(
     if not filter_name.lower().startswith("incontext"):
         return field_text
 
-    global incontext_id
-    filter_id = incontext_id
-
     options = dict(map(lambda o: o.split("="), filter_name.split()[1:]))
     lang = options.get("lang", None)
     provider_option = options.get("provider", None)
     providers = provider_option.split(",") if provider_option else None
 
+    if (requests := collected_requests()) is not None:
+        # The card is only being rendered to find out what to prefetch
+        requests.append(PrefetchRequest(field_text, lang, tuple(providers) if providers else None))
+        return field_text
+
+    card = ctx.card()
+    card_id = card.id
+    for_reviewer = is_reviewer_card(card)
+    # Filter IDs only need to be unique within the page showing the card
+    filter_number = ctx.extra_state.get("incontext_filter_count", 0)
+    ctx.extra_state["incontext_filter_count"] = filter_number + 1
+    filter_id = f"{card_id}-{filter_number}"
+    # Both sides are rendered with the same context, so count occurrences per side
+    side = "question" if ctx.question_side else "answer"
+    occurrences: Counter = ctx.extra_state.setdefault(f"incontext_{side}_occurrences", Counter())
+    key = (
+        card_id,
+        field_name,
+        filter_name,
+        field_text,
+        occurrences[(field_name, filter_name, field_text)],
+        for_reviewer,
+    )
+    occurrences[(field_name, filter_name, field_text)] += 1
+
     def task() -> str:
         return get_formatted_sentence(field_text, lang, providers)
 
     def on_done(fut: Future) -> None:
-        result = fut.result()
-        card_context = get_active_card_context()
-        if card_context.card and card_context.web and card_context.card.id == ctx.card().id:
-            card_context.web.eval(f"incontext.saveAndRenderSentence({filter_id}, {json.dumps(result)})")
+        deliver_sentence(card_id, filter_id, fut.result())
 
-    run_task_in_background(task, on_done, uses_collection=False)
-    incontext_id += 1
+    future = remembered_result(key) if card_id else None
+    if future:
+        when_done(future, on_done)
+    else:
+        future = run_lookup(card_id, task, on_done, for_reviewer)
+    if card_id:
+        remember_result(key, future, filter_id)
 
     refresh_icon = f"{WEB_BASE}/arrow-clockwise.svg"
     return f"""
@@ -111,17 +251,17 @@ def incontext_filter(
     <img
       src="{refresh_icon}"
       class="incontext-refresh-button incontext-loading"
-      onclick="incontext.refreshSentence({filter_id})"
+      onclick="incontext.refreshSentence('{filter_id}')"
     >
     <script>
-        incontext.renderSentence({filter_id});
+        incontext.renderSentence('{filter_id}');
     </script>
     """
 
 
 def on_card_will_show(text: str, card: Card, kind: str) -> str:
     if kind.endswith("Question"):
-        text = "<script>globalThis.inContextResults = [];</script>" + text
+        text = f"<script>incontext.startCard({card.id});</script>" + text
     return text
 
 
@@ -140,28 +280,36 @@ def on_webview_did_receive_js_message(handled: tuple[bool, Any], message: str, c
         options = json.loads(data)
         filter_id = options["id"]
         card_context = get_active_card_context()
+        card_id = card_context.card.id if card_context.card else 0
 
         def task() -> str:
             return get_formatted_sentence(options["query"], options["lang"], options["provider"])
 
         def on_done(fut: Future) -> None:
-            sentence = fut.result()
-            if card_context.card and card_context.web:
-                card_context.web.eval(
-                    f"""
-                    incontext.addSentence({filter_id}, {json.dumps(sentence)});
-                    incontext.renderSentence({filter_id});
-                    """
-                )
-
-        card_context.web.eval(f"incontext.setLoading({filter_id});")
-        run_task_in_background(task, on_done, uses_collection=False)
+            deliver_sentence(card_id, filter_id, fut.result())
+
+        card_context.web.eval(f"incontext.setLoading({json.dumps(filter_id)});")
+        future = run_lookup(card_id, task, on_done, is_reviewer_card(card_context.card))
+        with _results_lock:
+            key = _filter_result_keys.get(filter_id)
+        if key:
+            remember_result(key, future)
 
     return True, None
 
 
+def on_reviewer_did_show_question(card: Card) -> None:
+    cancel_lookups(except_card_id=card.id)
+
+
+def on_reviewer_will_end() -> None:
+    cancel_lookups()
+
+
 def init_hooks() -> None:
     hooks.field_filter.append(incontext_filter)
+    gui_hooks.reviewer_did_show_question.append(on_reviewer_did_show_question)
+    gui_hooks.reviewer_will_end.append(on_reviewer_will_end)
     gui_hooks.card_will_show.append(on_card_will_show)
     gui_hooks.webview_will_set_content.append(on_webview_will_set_content)
     gui_hooks.webview_did_receive_js_message.append(on_webview_did_receive_js_message)
@@ -1,10 +1,16 @@
 class InContext {
     constructor() {
-        this.sentences = [];
+        // Sentences of the card being shown by filter ID, including ones that arrived before their element
+        this.sentences = new Map();
     }
 
-    clearSentences() {
-        this.sentences = [];
+    startCard(cardId) {
+        // Filter IDs are prefixed with the card ID, so this drops everything from other cards
+        for (const filterId of this.sentences.keys()) {
+            if (!filterId.startsWith(`${cardId}-`)) {
+                this.sentences.delete(filterId);
+            }
+        }
     }
 
     _getSentenceElement(filterId) {
@@ -25,30 +31,23 @@ class InContext {
         pycmd(`incontext:refresh:${JSON.stringify(payload)}`);
     }
 
-    addSentence(filterId, sentence) {
-        this.sentences[filterId] = sentence;
+    deliverSentences(sentences) {
+        for (const [filterId, sentence] of Object.entries(sentences)) {
+            this.sentences.set(filterId, sentence);
+            this.renderSentence(filterId);
+        }
     }
 
+    // Also called by the script following each sentence element once it's added,
+    // which renders sentences that were delivered before the element existed
     renderSentence(filterId) {
         const sentenceElement = this._getSentenceElement(filterId);
-        if (this.sentences[filterId]) {
-            sentenceElement.innerHTML = this.sentences[filterId];
+        if (sentenceElement && this.sentences.has(filterId)) {
+            sentenceElement.innerHTML = this.sentences.get(filterId);
             sentenceElement.nextElementSibling.classList.remove("incontext-loading");
         }
     }
 
-    saveAndRenderSentence(filterId, sentence) {
-        const inContextIntervalID = setInterval(() => {
-            const inContextSentenceElement = this._getSentenceElement(filterId);
-            if (inContextSentenceElement) {
-                clearInterval(inContextIntervalID);
-                this.sentences[filterId] = sentence;
-                inContextSentenceElement.innerHTML = sentence;
-                inContextSentenceElement.nextElementSibling.classList.remove("incontext-loading");
-            }
-        }, 100);
-    }
-
     setLoading(filterId) {
         const sentenceElement = this._getSentenceElement(filterId);
         sentenceElement.nextElementSibling.classList.add("incontext-loading");
@@ -1,6 +1,9 @@
+import sqlite3
 from pathlib import Path
 
-from src.db import Sentence, SentenceDB
+import pytest
+
+from src.db import FETCH_OK, Sentence, SentenceDB
 
 
 def test_add(tmpdir: Path) -> None:
@@ -12,3 +15,168 @@ def test_add(tmpdir: Path) -> None:
         assert sentences[0].word == "world"
         assert sentences[0].language == "en"
         assert sentences[0].provider == "test"
+
+
+def test_get_random_sentences(tmpdir: Path) -> None:
+    with SentenceDB(tmpdir / "sentences.db") as db:
+        db.add_sentences([Sentence(f"Sentence {i}", "word", "en", "test") for i in range(20)])
+        db.add_sentences([Sentence("Other provider", "word", "en", "other")])
+        for _ in range(20):
+            sentences = db.get_random_sentences("word", "en", "test", 5)
+            assert len({sentence.text for sentence in sentences}) == 5
+            assert all(sentence.provider == "test" for sentence in sentences)
+        assert len(db.get_random_sentences("word", "en", "test", 50)) == 20
+        assert len(db.get_random_sentences("word", "en", "test")) == 20
+        assert db.get_random_sentences("missing", "en", "test", 1) == []
+
+
+def test_samples_large_groups_uniformly(tmpdir: Path) -> None:
+    with SentenceDB(tmpdir / "sentences.db") as db:
+        db.add_sentences([Sentence(f"Sentence {i}", "word", "en", "test") for i in range(600)])
+        db.add_sentences([Sentence("Sentence 0", "word", "en", "test", "updated")])
+        counts = dict.fromkeys((f"Sentence {i}" for i in range(600)), 0)
+        for _ in range(200):
+            sentences = db.get_random_sentences("word", "en", "test", 50)
+            assert len({sentence.text for sentence in sentences}) == 50
+            for sentence in sentences:
+                counts[sentence.text] += 1
+        # Each sentence is expected to be picked about 17 times
+        assert 0 < min(counts.values()) and max(counts.values()) < 50
+        # Only the first lookup finds out that the group is too large to keep in memory
+        assert db.memory_cache.stats()["hits"] == 199
+        results, misses = db.get_random_sentences_batch([("word", "en", "test")], 3)
+        assert len(results[("word", "en", "test")]) == 3
+        assert misses == []
+
+
+def test_reads_do_not_wait_on_writes(tmpdir: Path) -> None:
+    with SentenceDB(tmpdir / "sentences.db") as db:
+        db.add_sentences([Sentence("Committed", "word", "en", "test")])
+        with db.lock:
+            db.con.execute("BEGIN IMMEDIATE")
+            db._insert_sentences([Sentence("Pending", "word", "en", "test")])
+            assert [sentence.text for sentence in db.get_sentences(word="word")] == ["Committed"]
+            db.con.commit()
+        assert len(db.get_random_sentences("word", "en", "test")) == 2
+
+
+def test_evicts_least_recently_used(tmpdir: Path) -> None:
+    with SentenceDB(tmpdir / "sentences.db", max_sentences=25) as db:
+        for word in ("old", "used", "new"):
+            db.add_sentences([Sentence(f"{word} {i}", word, "en", "test") for i in range(10)])
+            db.record_fetch(word, "en", "test", FETCH_OK)
+        with db.lock, db.con:
+            db.con.execute("UPDATE fetches SET fetched_at = 0 WHERE word != 'new'")
+        db.get_random_sentences("used", "en", "test", 1)
+        db.maintain()
+        assert {sentence.word for sentence in db.get_sentences()} == {"used", "new"}
+        assert db.get_fetch_status("old", "en", "test") is None
+        db.max_sentences = 0
+        db.max_size = 1
+        db.maintain()
+        assert db.get_sentences() == []
+
+
+def test_memory_cache(tmpdir: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    with SentenceDB(tmpdir / "sentences.db") as db:
+        db.add_sentences([Sentence("First", "word", "en", "test")])
+        assert len(db.get_random_sentences("word", "en", "test", 5)) == 1
+        assert db.get_fetch_status("word", "en", "test") is None
+        with monkeypatch.context() as patch:
+            patch.setattr(db, "_reader", None)
+            assert db.get_random_sentences("word", "en", "test", 5)[0].text == "First"
+            assert db.get_fetch_status("word", "en", "test") is None
+        assert db.memory_cache.stats()["hits"] == 2
+        db.add_sentences([Sentence("Second", "word", "en", "test")])
+        db.record_fetch("word", "en", "test", FETCH_OK)
+        assert len(db.get_random_sentences("word", "en", "test")) == 2
+        assert db.get_fetch_status("word", "en", "test").status == FETCH_OK
+
+
+def test_get_random_sentences_batch(tmpdir: Path) -> None:
+    with SentenceDB(tmpdir / "sentences.db") as db:
+        db.add_sentences([Sentence(f"{word} {i}", word, "en", "test") for word in ("a", "b") for i in range(3)])
+        assert len(db.get_random_sentences("a", "en", "test")) == 3
+        keys = [("a", "en", "test"), ("b", "en", "test"), ("c", "en", "test"), ("b", "en", "other")]
+        found, misses = db.get_random_sentences_batch(keys * 2, limit=2)
+        assert {key: len(sentences) for key, sentences in found.items()} == {keys[0]: 2, keys[1]: 2}
+        assert misses == keys[2:]
+        assert db.get_random_sentences_batch([], limit=2) == ({}, [])
+
+
+def test_texts_are_stored_once(tmpdir: Path) -> None:
+    long_text = "A long sentence that gets compressed. " * 10
+    with SentenceDB(tmpdir / "sentences.db") as db:
+        db.add_sentences([Sentence(text, word, "en", "test") for text in ("Short", long_text) for word in ("a", "b")])
+        db.add_sentences([Sentence("Short", "a", "en", "other")])
+        assert db.con.execute("SELECT count(*) FROM sentence_texts").fetchone()[0] == 2
+        assert db.con.execute("SELECT count(*) FROM sentence_texts WHERE typeof(text) = 'blob'").fetchone()[0] == 1
+        assert sorted(sentence.text for sentence in db.get_random_sentences("b", "en", "test")) == [long_text, "Short"]
+        db.replace_sentences("a", "en", "other", [])
+        db.maintain()
+        assert db.con.execute("SELECT count(*) FROM sentence_texts").fetchone()[0] == 2
+        for word in ("a", "b"):
+            db.replace_sentences(word, "en", "test", [Sentence("New", word, "en", "test")])
+        db.maintain()
+        assert db.con.execute("SELECT count(*) FROM sentence_texts").fetchone()[0] == 1
+
+
+def test_upgrade_moves_texts(tmpdir: Path) -> None:
+    path = tmpdir / "sentences.db"
+    con = sqlite3.connect(path)
+    con.executescript(
+        """
+        CREATE TABLE sentences (
+            text TEXT, word TEXT, language TEXT, provider TEXT, source TEXT, PRIMARY KEY(text, word, language, provider)
+        );
+        CREATE TABLE col (id INT PRIMARY KEY, ver INT);
+        INSERT INTO col (id, ver) VALUES (1, 2);
+        INSERT INTO sentences VALUES ('Shared', 'a', 'en', 'test', ''), ('Shared', 'b', 'en', 'test', 'url');
+        """
+    )
+    con.close()
+    with SentenceDB(path) as db:
+        assert db.con.execute("SELECT count(*) FROM sentence_texts").fetchone()[0] == 1
+        assert [(sentence.text, sentence.source) for sentence in db.get_sentences(word="b")] == [("Shared", "url")]
+        assert db.get_fetch_status("a", "en", "test").status == FETCH_OK
+
+
+def test_failed_upgrade_is_rolled_back(tmpdir: Path) -> None:
+    path = tmpdir / "sentences.db"
+    con = sqlite3.connect(path)
+    con.executescript(
+        """
+        CREATE TABLE sentences (
+            text TEXT, word TEXT, language TEXT, provider TEXT, source TEXT, PRIMARY KEY(text, word, language, provider)
+        );
+        CREATE TABLE col (id INT PRIMARY KEY, ver INT);
+        INSERT INTO col (id, ver) VALUES (1, 2);
+        INSERT INTO sentences VALUES ('Kept', 'a', 'en', 'test', ''), (NULL, 'b', 'en', 'test', '');
+        """
+    )
+    con.close()
+    # Hashing the NULL text fails halfway through the upgrade to version 7
+    with pytest.raises(sqlite3.OperationalError):
+        SentenceDB(path)
+    con = sqlite3.connect(path)
+    with con:
+        assert con.execute("SELECT ver FROM col").fetchone()[0] == 6
+        con.execute("DELETE FROM sentences WHERE text IS NULL")
+    con.close()
+    with SentenceDB(path) as db:
+        assert [sentence.text for sentence in db.get_sentences()] == ["Kept"]
+
+
+def test_full_vacuum_is_left_to_enable_incremental_vacuum(tmpdir: Path) -> None:
+    path = tmpdir / "sentences.db"
+    con = sqlite3.connect(path)
+    con.executescript("CREATE TABLE col (id INT PRIMARY KEY, ver INT); INSERT INTO col (id, ver) VALUES (1, 1);")
+    con.executescript("CREATE TABLE sentences (text TEXT, word TEXT, language TEXT, provider TEXT);")
+    con.close()
+    with SentenceDB(path) as db:
+        db.add_sentences([Sentence("Hello", "word", "en", "test")])
+        db.maintain()
+        assert db.needs_full_vacuum()
+        db.enable_incremental_vacuum()
+        assert not db.needs_full_vacuum()
+        assert [sentence.text for sentence in db.get_sentences()] == ["Hello"]
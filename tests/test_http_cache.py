@@ -0,0 +1,25 @@
+import os
+from pathlib import Path
+
+from src.http_cache import CachedResponse, HTTPCache
+
+
+def test_put_and_get(tmpdir: Path) -> None:
+    with HTTPCache(tmpdir / "http_cache.db") as cache:
+        assert cache.get("https://example.com") is None
+        cache.put(CachedResponse("https://example.com", b"<html></html>", etag='"abc"'))
+        cached = cache.get("https://example.com")
+        assert cached.content == b"<html></html>"
+        assert cached.etag == '"abc"'
+        assert cached.last_modified is None
+
+
+def test_evicts_least_recently_used(tmpdir: Path) -> None:
+    with HTTPCache(tmpdir / "http_cache.db", max_size=2500) as cache:
+        for i in range(3):
+            cache.put(CachedResponse(f"https://example.com/{i}", os.urandom(1000), etag=str(i)))
+            if i == 1:
+                cache.touch("https://example.com/0")
+        assert cache.get("https://example.com/0") is not None
+        assert cache.get("https://example.com/1") is None
+        assert cache.get("https://example.com/2") is not None
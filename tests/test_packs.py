@@ -0,0 +1,42 @@
+import gzip
+from pathlib import Path
+
+import pytest
+
+from src.db import FETCH_EMPTY, FETCH_OK, Sentence, SentenceDB
+from src.exceptions import InContextInvalidPackError
+from src.packs import export_pack, import_pack
+
+
+def test_export_and_import(tmpdir: Path) -> None:
+    pack = Path(tmpdir / "sentences.icpack")
+    with SentenceDB(tmpdir / "source.db") as db:
+        db.add_sentences([Sentence(f"{word} {i}", word, "en", "test", "url") for word in ("a", "b") for i in range(3)])
+        db.add_sentences([Sentence("Other", "a", "ja", "test")])
+        db.record_fetch("a", "en", "test", FETCH_OK)
+        db.record_fetch("a", "ja", "test", FETCH_OK)
+        assert db.get_cached_languages() == ["en", "ja"]
+        assert export_pack(db, pack, language="en", words=["a", "c"]) == 3
+    with SentenceDB(tmpdir / "target.db") as db:
+        db.add_sentences([Sentence("a 0", "a", "en", "test", "kept")])
+        db.record_fetch("a", "en", "test", FETCH_EMPTY)
+        assert import_pack(db, pack) == 3
+        assert sorted((sentence.text, sentence.source) for sentence in db.get_sentences()) == [
+            ("a 0", "kept"),
+            ("a 1", "url"),
+            ("a 2", "url"),
+        ]
+        assert db.get_fetch_status("a", "en", "test").status == FETCH_OK
+
+
+def test_corrupted_pack_is_rejected(tmpdir: Path) -> None:
+    pack = Path(tmpdir / "sentences.icpack")
+    with SentenceDB(tmpdir / "source.db") as db:
+        db.add_sentences([Sentence(f"Sentence {i}", "word", "en", "test") for i in range(3)])
+        export_pack(db, pack)
+    lines = gzip.decompress(pack.read_bytes()).splitlines(keepends=True)
+    pack.write_bytes(gzip.compress(b"".join(lines[:2] + lines[3:])))
+    with SentenceDB(tmpdir / "target.db") as db:
+        with pytest.raises(InContextInvalidPackError):
+            import_pack(db, pack)
+        assert db.get_sentences() == []
@@ -0,0 +1,159 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from src import providers
+from src.cancellation import CancellationToken, run_with_token
+from src.config import config
+from src.db import Sentence, SentenceDB
+from src.exceptions import InContextCancelledError, InContextError
+from src.providers import get_provider, get_providers_for_language, get_sentences, init_providers
+from src.providers.provider import SentenceProvider
+
+
+def test_routes(tmpdir: Path) -> None:
+    with SentenceDB(tmpdir / "sentences.db") as db:
+        init_providers(db)
+        assert get_provider("jisho").name == "jisho"
+        assert get_provider("nonexistent") is None
+        for language in ("jpn", "ja", "Japanese"):
+            names = [provider.name for provider in get_providers_for_language(language)]
+            assert "jisho" in names
+            assert "oxford_learner" not in names
+
+
+class FakeProvider(SentenceProvider):
+    human_name = "Fake"
+    url = ""
+
+    def __init__(self, db: SentenceDB, name: str, delay: float = 0.0, fail: bool = False, empty: bool = False):
+        super().__init__(db, {})
+        self.name = name
+        self.delay = delay
+        self.fail = fail
+        self.empty = empty
+        self.calls = 0
+
+    @property
+    def supported_languages(self) -> list[str]:
+        return ["eng"]
+
+    def fetch(self, word: str, language: str) -> list[Sentence]:
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.fail:
+            raise InContextError("failed")
+        if self.empty:
+            return []
+        return [Sentence(f"{word} from {self.name}", word, language, self.name)]
+
+    def get_source(self, word: str, language: str) -> str:
+        return ""
+
+
+def test_get_sentences_fans_out_with_deadline(tmpdir: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setitem(config, "fetch_timeout", 0.5)
+    with SentenceDB(tmpdir / "sentences.db") as db:
+        monkeypatch.setattr(
+            providers,
+            "PROVIDERS",
+            [FakeProvider(db, "fast"), FakeProvider(db, "slow", delay=2), FakeProvider(db, "broken", fail=True)],
+        )
+        providers.build_routes()
+        start = time.monotonic()
+        sentences, errors = get_sentences("word", "eng")
+        assert time.monotonic() - start < 1.5
+        assert [sentence.provider for sentence in sentences] == ["fast"]
+        assert sorted((error.provider, str(error)) for error in errors) == [
+            ("broken", "failed"),
+            ("slow", "Timed out after 0.5 seconds"),
+        ]
+
+
+def test_negative_results_are_cached(tmpdir: Path) -> None:
+    with SentenceDB(tmpdir / "sentences.db") as db:
+        empty = FakeProvider(db, "empty", empty=True)
+        broken = FakeProvider(db, "broken", fail=True)
+        for _ in range(3):
+            assert empty.get_sentences("word", "eng") == []
+            with pytest.raises(InContextError, match="failed"):
+                broken.get_sentences("word", "eng")
+        assert (empty.calls, broken.calls) == (1, 1)
+        assert db.get_fetch_status("word", "eng", "empty").failures == 1
+
+
+def test_stale_sentences_are_refreshed_in_background(tmpdir: Path) -> None:
+    with SentenceDB(tmpdir / "sentences.db") as db:
+        provider = FakeProvider(db, "fake")
+        assert [sentence.text for sentence in provider.get_sentences("word", "eng")] == ["word from fake"]
+        assert [sentence.text for sentence in provider.get_sentences("word", "eng", limit=5)] == ["word from fake"]
+        assert provider.calls == 1
+        with db.lock, db.con:
+            db.con.execute("UPDATE fetches SET fetched_at = 0")
+        db.memory_cache.clear()
+        provider.delay = 0.2
+        start = time.monotonic()
+        assert [sentence.text for sentence in provider.get_sentences("word", "eng")] == ["word from fake"]
+        assert time.monotonic() - start < 0.2
+        deadline = time.monotonic() + 5
+        while db.get_fetch_status("word", "eng", "fake").fetched_at == 0 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert provider.calls == 2
+        assert db.get_fetch_status("word", "eng", "fake").fetched_at > 0
+
+
+def test_failed_refreshes_back_off(tmpdir: Path) -> None:
+    with SentenceDB(tmpdir / "sentences.db") as db:
+        provider = FakeProvider(db, "flaky")
+        provider.get_sentences("word", "eng")
+        with db.lock, db.con:
+            db.con.execute("UPDATE fetches SET fetched_at = 0")
+        db.memory_cache.clear()
+        provider.fail = True
+        provider.get_sentences("word", "eng")
+        deadline = time.monotonic() + 5
+        while db.get_fetch_status("word", "eng", "flaky").failures == 0 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        for _ in range(3):
+            assert [sentence.text for sentence in provider.get_sentences("word", "eng")] == ["word from flaky"]
+        time.sleep(0.2)
+        assert provider.calls == 2
+        status = db.get_fetch_status("word", "eng", "flaky")
+        assert (status.status, status.failures, status.error) == ("ok", 1, "failed")
+
+
+def test_concurrent_fetches_are_coalesced(tmpdir: Path) -> None:
+    with SentenceDB(tmpdir / "sentences.db") as db:
+        provider = FakeProvider(db, "fake", delay=0.3)
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(lambda _: provider.get_sentences("word", "eng"), range(4)))
+        assert provider.calls == 1
+        assert all([sentence.text for sentence in result] == ["word from fake"] for result in results)
+        provider.fail = True
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = [executor.submit(provider.get_sentences, "other", "eng") for _ in range(2)]
+            for future in futures:
+                with pytest.raises(InContextError, match="failed"):
+                    future.result()
+        assert provider.calls == 2
+
+
+def test_cancelled_lookups_stop(tmpdir: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setitem(config, "fetch_timeout", 0)
+    with SentenceDB(tmpdir / "sentences.db") as db:
+        provider = FakeProvider(db, "stale", delay=0.5)
+        monkeypatch.setattr(providers, "PROVIDERS", [provider])
+        providers.build_routes()
+        token = CancellationToken()
+        threading.Timer(0.1, token.cancel).start()
+        start = time.monotonic()
+        with pytest.raises(InContextCancelledError):
+            run_with_token(token, get_sentences, "word", "eng")
+        assert time.monotonic() - start < 0.4
+        time.sleep(0.6)
+        assert provider.calls == 1
+        assert db.get_sentences() == []
+        assert db.get_fetch_status("word", "eng", "stale") is None
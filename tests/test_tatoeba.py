@@ -0,0 +1,164 @@
+import bz2
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from src.exceptions import InContextIncompleteDownloadError
+from src.providers import tatoeba
+from src.providers.tatoeba import (
+    TatoebaConnectionPool,
+    TatoebaDB,
+    TatoebaLanguageRegistry,
+    connection_pool,
+    iter_tsv_rows,
+    upgrade_database,
+)
+
+
+@pytest.fixture(autouse=True)
+def data_dir(tmpdir: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    path = Path(tmpdir)
+    monkeypatch.setattr(tatoeba, "tatoeba_data_dir", lambda: path)
+    return path
+
+
+def test_get_sentences_matches_whole_words() -> None:
+    with TatoebaDB("eng") as db:
+        db.add_sentences(
+            list(enumerate(["I like cats.", "Catsup is red.", "Cats are cute", "Black cats, white cats"], start=1))
+        )
+        assert sorted(db.get_sentences("cats")) == ["Black cats, white cats", "Cats are cute", "I like cats."]
+        assert db.get_sentences("like cats") == ["I like cats."]
+        assert db.get_sentences('"') == []
+
+
+def test_migrates_legacy_db(data_dir: Path) -> None:
+    conn = sqlite3.connect(data_dir / "eng_sentences.db")
+    conn.executescript("CREATE TABLE sentences (text TEXT); INSERT INTO sentences VALUES ('An old sentence');")
+    conn.close()
+    with TatoebaDB("eng") as db:
+        assert db.get_sentences("old") == ["An old sentence"]
+
+
+def test_outdated_db_is_searched_until_upgraded(data_dir: Path) -> None:
+    conn = sqlite3.connect(data_dir / "eng_sentences.db")
+    conn.executescript("CREATE TABLE sentences (text TEXT); INSERT INTO sentences VALUES ('An old sentence');")
+    conn.close()
+    with connection_pool.reader("eng") as reader:
+        assert reader.outdated
+        assert reader.get_sentences("old") == ["An old sentence"]
+    assert upgrade_database("eng")
+    assert not upgrade_database("eng")
+    with connection_pool.reader("eng") as reader:
+        assert not reader.outdated
+        assert reader.get_sentences("old") == ["An old sentence"]
+        assert not reader.is_keyed()
+    connection_pool.close()
+
+
+def test_iter_tsv_rows_streams_across_chunks() -> None:
+    data = bz2.compress("1\teng\tHello world\n2\tjpn\t日本語です\n".encode()) + bz2.compress(b"3\teng\tLast one")
+    chunks = [data[i : i + 7] for i in range(0, len(data), 7)]
+    assert list(iter_tsv_rows(chunks)) == [
+        ["1", "eng", "Hello world"],
+        ["2", "jpn", "日本語です"],
+        ["3", "eng", "Last one"],
+    ]
+
+
+def test_iter_tsv_rows_rejects_truncated_stream() -> None:
+    data = bz2.compress("".join(f"{i}\teng\tSentence number {i}\n" for i in range(10_000)).encode())
+    rows = iter_tsv_rows([data[: len(data) // 2]])
+    with pytest.raises(InContextIncompleteDownloadError):
+        for row in rows:
+            assert row[2].startswith("Sentence number")
+    with pytest.raises(InContextIncompleteDownloadError):
+        list(iter_tsv_rows([]))
+
+
+def test_bulk_load_swaps_in_complete_db(data_dir: Path) -> None:
+    with TatoebaDB("eng") as db:
+        db.add_sentences([(1, "Old sentence")])
+    with pytest.raises(RuntimeError):
+        with TatoebaDB.bulk_load("eng") as db:
+            db.add_sentences([(2, "New sentence")])
+            raise RuntimeError()
+    with TatoebaDB("eng") as db:
+        assert db.get_sentences("sentence") == ["Old sentence"]
+    with TatoebaDB.bulk_load("eng") as db:
+        db.add_sentences([(2, "New sentence")])
+    with TatoebaDB("eng") as db:
+        assert db.get_sentences("sentence") == ["New sentence"]
+    assert [path.name for path in data_dir.iterdir()] == ["eng_sentences.db"]
+
+
+def test_delta_update() -> None:
+    with TatoebaDB.bulk_load("eng") as db:
+        db.add_sentences([(1, "The first sentence"), (2, "The second sentence"), (3, "The third sentence")])
+    with TatoebaDB("eng") as db:
+        assert db.is_keyed()
+        with db.delta_update():
+            db.add_sentences([(1, "The first sentence"), (3, "The third sentence, edited"), (4, "A new sentence")])
+        assert (db.changed_count, db.removed_count) == (2, 1)
+        assert sorted(db.get_sentences("sentence")) == [
+            "A new sentence",
+            "The first sentence",
+            "The third sentence, edited",
+        ]
+        assert db.get_sentences("second") == []
+
+
+def test_delta_update_does_not_lock_database_until_applied(data_dir: Path) -> None:
+    with TatoebaDB.bulk_load("eng") as db:
+        db.add_sentences([(1, "The first sentence")])
+    other = sqlite3.connect(data_dir / "eng_sentences.db", timeout=0)
+    with TatoebaDB("eng") as db:
+        with db.delta_update():
+            db.add_sentences([(1, "The first sentence, edited")])
+            # Another connection can still take the write lock, so lookups aren't blocked either
+            other.execute("BEGIN IMMEDIATE")
+            other.rollback()
+            assert db.get_sentences("first") == ["The first sentence"]
+        assert db.get_sentences("first") == ["The first sentence, edited"]
+    other.close()
+
+
+def test_cjk_ngram_search() -> None:
+    with TatoebaDB("jpn") as db:
+        db.add_sentences([(1, "日本語を勉強しています。"), (2, "本を読みます"), (3, "CDを買った"), (4, "日曜日")])
+        assert db.get_sentences("日本語") == ["日本語を勉強しています。"]
+        assert sorted(db.get_sentences("本")) == ["日本語を勉強しています。", "本を読みます"]
+        assert db.get_sentences("日") == ["日本語を勉強しています。", "日曜日"]
+        assert db.get_sentences("cd") == ["CDを買った"]
+        assert db.get_sentences("本語を読") == []
+        with db.delta_update():
+            db.add_sentences([(1, "英語を勉強しています。"), (2, "本を読みます")])
+        assert db.get_sentences("日本語") == []
+        assert db.get_sentences("英語") == ["英語を勉強しています。"]
+
+
+def test_pool_reuses_readers_until_invalidated() -> None:
+    pool = TatoebaConnectionPool()
+    with TatoebaDB.bulk_load("eng") as db:
+        db.add_sentences([(1, "Old sentence")])
+    with pool.reader("eng") as reader:
+        assert reader.get_sentences("sentence") == ["Old sentence"]
+    with pool.reader("en") as reader2:
+        assert reader2 is reader
+    with pool.writer("eng"):
+        with TatoebaDB.bulk_load("eng", before_replace=lambda: pool.invalidate("eng")) as db:
+            db.add_sentences([(2, "New sentence")])
+    with pool.reader("eng") as reader3:
+        assert reader3 is not reader
+        assert reader3.get_sentences("sentence") == ["New sentence"]
+    pool.close()
+
+
+def test_language_registry() -> None:
+    registry = TatoebaLanguageRegistry(validate_interval=3600)
+    assert registry.languages() == []
+    TatoebaDB("eng").conn.close()
+    assert registry.languages() == []
+    registry.add("eng")
+    assert registry.languages() == ["eng"]